@@ -7,42 +7,62 @@ import mlflow
 import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
-from langchain.prompts import PromptTemplate
-from langchain_core.messages import AIMessage, HumanMessage
-from openai import BadRequestError
 
 from src.fin_qa import setup_logger
 from src.fin_qa.agents import FinancialAnalysisAgents
-from src.fin_qa.data_conversion import (
-    convert_to_markdown_table,
-    convert_to_paragraph,
-    fix_invalid_json,
+from src.fin_qa.arguments import temperature_range
+from src.fin_qa.cascade import CONFIDENCE_SIGNALS, CascadeTier, ModelCascade
+from src.fin_qa.data_conversion import convert_to_markdown_table, convert_to_paragraph
+from src.fin_qa.data_loader import (
+    RecordIndex,
+    load_financial_data,
+    load_prompt_template,
+    read_ids_file,
+)
+from src.fin_qa.evaluate import (
+    exact_match,
+    intervals_converged,
+    median_interval,
+    numerical_match,
+    proportion_interval,
 )
-from src.fin_qa.data_loader import load_financial_data, load_prompt_template
-from src.fin_qa.evaluate import exact_match, numerical_match
 from src.fin_qa.graph import FinancialAnalysisGraph
+from src.fin_qa.latency import Deadline, HedgedRunnable, LatencyTracker
+from src.fin_qa.pool import POOL_STRATEGIES, load_pools
+from src.fin_qa.profiling import LLM_WAIT, LOCAL, SamplingProfiler, render_flamegraph
+from src.fin_qa.sampling import SAMPLE_STRATEGIES, sample_records
 
 logger = setup_logger(__file__)
 
 
-def temperature_range(value: str) -> float:
-    """
-    Validate that the temperature is between 0.0 and 1.0.
-    """
-    try:
-        temp = float(value)
-    except ValueError:
-        raise argparse.ArgumentTypeError(f"'{value}' is not a valid float.")
-
-    if not (0.0 <= temp <= 1.0):
-        raise argparse.ArgumentTypeError(
-            f"Temperature must be between 0.0 and 1.0, got {value}."
-        )
-
-    return temp
-
-
-def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
+def main(
+    model: str,
+    temperature: float,
+    data_path: str,
+    n: int | None,
+    verbose: bool,
+    deadline: float | None = None,
+    hedge: bool = False,
+    compact_state: bool = False,
+    summarize_rounds: bool = False,
+    sample: str = "head",
+    seed: int | None = None,
+    sequential: bool = False,
+    nm_ci_width: float = 10.0,
+    p50_ci_width: float = 2.0,
+    min_questions: int = 30,
+    profile: bool = False,
+    ids: list[str] | None = None,
+    ids_file: str | None = None,
+    start_index: int | None = None,
+    stop_index: int | None = None,
+    cascade: list[str] | None = None,
+    critic_model: str | None = None,
+    cascade_signals: list[str] | None = None,
+    pool: str | None = None,
+    pool_strategy: str = "least-outstanding",
+    joint_questions: bool = False,
+):
     """
     Main async function to run financial analysis workflow.
     """
@@ -60,30 +80,115 @@ def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
         mlflow.log_param("model", model)
         mlflow.log_param("temperature", temperature)
         mlflow.log_param("data_path", data_path)
-
-        # Create agents and graph
-        generate, reflect, parser = FinancialAnalysisAgents.create_agents(
-            model=model, temperature=temperature
-        )
-        graph = FinancialAnalysisGraph.create_graph(generate, reflect)
-
-        financial_analyst_message = (
-            generate.get_prompts()[0].messages[0].prompt.template
-        )
-        critic_message = reflect.get_prompts()[0].messages[0].prompt.template
+        mlflow.log_param("deadline", deadline)
+        mlflow.log_param("hedge", hedge)
+        mlflow.log_param("compact_state", compact_state)
+        mlflow.log_param("summarize_rounds", summarize_rounds)
+        mlflow.log_param("sample", sample)
+        mlflow.log_param("seed", seed)
+        mlflow.log_param("sequential", sequential)
+        mlflow.log_param("profile", profile)
+        mlflow.log_param("joint_questions", joint_questions)
+        mlflow.log_param("critic_model", critic_model)
+        if cascade:
+            mlflow.log_param("cascade", cascade)
+            mlflow.log_param("cascade_signals", cascade_signals)
+        if pool:
+            mlflow.log_param("pool", pool)
+            mlflow.log_param("pool_strategy", pool_strategy)
+
+        # Endpoint pools are shared by the agents of every tier
+        pools = load_pools(pool, pool_strategy) if pool else None
+        if ids or ids_file or start_index is not None or stop_index is not None:
+            mlflow.log_param("ids", ids)
+            mlflow.log_param("ids_file", ids_file)
+            mlflow.log_param("start", start_index)
+            mlflow.log_param("stop", stop_index)
+        if sequential:
+            mlflow.log_param("nm_ci_width", nm_ci_width)
+            mlflow.log_param("p50_ci_width", p50_ci_width)
+            mlflow.log_param("min_questions", min_questions)
+
+        # Create agents and graph of each tier, cheaper models first
+        tiers = []
+        hedged = []
+        for tier_model in [*(cascade or []), model]:
+            generate, reflect, parser = FinancialAnalysisAgents.create_agents(
+                model=tier_model,
+                temperature=temperature,
+                critic_model=critic_model,
+                pools=pools,
+            )
+
+            financial_analyst_message = (
+                generate.get_prompts()[0].messages[0].prompt.template
+            )
+            critic_message = reflect.get_prompts()[0].messages[0].prompt.template
+
+            # Latencies differ between models, so each tier has its own tracker
+            tracker = LatencyTracker()
+            if hedge:
+                generate = HedgedRunnable(generate, "generate", tracker)
+                reflect = HedgedRunnable(reflect, "reflect", tracker)
+                hedged += [generate, reflect]
+            graph = FinancialAnalysisGraph.create_graph(
+                generate,
+                reflect,
+                tracker,
+                compact=compact_state,
+                summarize=summarize_rounds,
+            )
+            tiers.append(CascadeTier(tier_model, graph, parser, generate, reflect))
 
         mlflow.log_param("financial_analyst_message", financial_analyst_message)
         mlflow.log_param("critic_message", critic_message)
+        if joint_questions:
+            mlflow.log_param(
+                "critic_batch_message", load_prompt_template("critic", batch=True)
+            )
+
+        model_cascade = ModelCascade(tiers, cascade_signals)
 
         records = []
 
-        # Process financial data
-        for idx, data in enumerate(load_financial_data(data_path)):
-            logger.info(f"Answering question #{idx + 1} of {n}")
+        # Sample stacks across the run to separate local work from LLM wait
+        profiler = SamplingProfiler()
+        if profile:
+            profiler.start()
+
+        # Select records to process, and the questions to ask of each record
+        # when only some of them are requested
+        requested_questions = {}
+        if ids or ids_file or start_index is not None or stop_index is not None:
+            # Seek to the requested records using the index of the data file
+            index = RecordIndex.load(data_path)
+            if ids or ids_file:
+                requested_questions = dict.fromkeys(ids or [])
+                for record_id, question in read_ids_file(ids_file) if ids_file else []:
+                    if question is None:
+                        requested_questions[record_id] = None
+                    elif record_id not in requested_questions:
+                        requested_questions[record_id] = {question}
+                    elif requested_questions[record_id] is not None:
+                        requested_questions[record_id].add(question)
+                requested = list(requested_questions)
+            else:
+                requested = index.ids
+            requested = requested[start_index:stop_index]
+            selected = list(index.read(requested))
+            if not selected:
+                logger.info("No requested record found, nothing to process")
+                profiler.stop()
+                return
+        else:
+            financial_data = list(load_financial_data(data_path))
+            selected = sample_records(
+                financial_data, len(financial_data) if n is None else n, sample, seed
+            )
 
-            config = {
-                "configurable": {"thread_id": f"{idx}"},
-            }
+        # Process financial data
+        for idx, data in enumerate(selected):
+            logger.info(f"Answering question #{idx + 1} of {len(selected)}")
 
             # Prepare context
             pre_text = convert_to_paragraph(data["pre_text"])
@@ -95,85 +200,137 @@ def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
             for key in ["qa_0", "qa_1", "qa"]:
                 if data.get(key):
                     question_answer.append((data[key]["question"], data[key]["answer"]))
+            if requested_questions.get(data["id"]) is not None:
+                question_answer = [
+                    qa
+                    for qa in question_answer
+                    if qa[0] in requested_questions[data["id"]]
+                ]
 
-            # Analyze each question
-            for question, ground_truth in question_answer:
-                user_proxy_message = load_prompt_template(
-                    "user_proxy",
-                    question=question,
-                    pre_text=pre_text,
-                    table=table,
-                    post_text=post_text,
-                )
+            # Analyze each question, or all questions of the record together
+            if joint_questions and len(question_answer) > 1:
+                groups = [question_answer]
+            else:
+                groups = [[qa] for qa in question_answer]
 
-                start = time.perf_counter()
+            context = {"pre_text": pre_text, "table": table, "post_text": post_text}
 
-                try:
-                    response = graph.invoke(
-                        {
-                            "messages": [HumanMessage(content=user_proxy_message)],
-                        },
-                        config,
+            for q_idx, group in enumerate(groups):
+                questions = [question for question, _ in group]
+                if len(group) > 1:
+                    user_proxy_message = load_prompt_template(
+                        "user_proxy_batch", questions=questions, **context
                     )
-                except BadRequestError as e:
-                    logger.error(
-                        f"An unexpected BadRequestError occurred for request {data['id']}: {e}"
-                    )
-                except Exception as e:
-                    logger.error(
-                        f"An unexpected error occurred for request {data['id']}: {e}"
+                else:
+                    user_proxy_message = load_prompt_template(
+                        "user_proxy", question=questions[0], **context
                     )
 
+                question_deadline = Deadline(deadline) if deadline else None
+
+                start = time.perf_counter()
+
+                result = model_cascade.answer(
+                    user_proxy_message,
+                    f"{idx}-{q_idx}",
+                    question_deadline,
+                    data["id"],
+                    len(group),
+                )
+
                 end = time.perf_counter()
 
                 latency = end - start
 
-                # Filter messages with json from Agent conversation
-                ai_messages = [
-                    x.content for x in response["messages"] if isinstance(x, AIMessage)
-                ]
+                outcomes = [(group, result, latency)]
 
-                prompt_value = PromptTemplate(
-                    template=user_proxy_message
-                ).format_prompt()
-                # Select final json message from AI
-                if len(ai_messages) >= 1:
-                    content = ai_messages[-1]
-                    # parsed_content = parser.parse(fix_invalid_json(content))
-                    try:
-                        parsed_content = parser.parse_with_prompt(
-                            fix_invalid_json(content), prompt_value
+                # Ask each question on its own when the joint answer cannot be split
+                if len(group) > 1 and result["answers"] is None:
+                    logger.warning(
+                        f"Joint answer of record {data['id']} could not be split, "
+                        "asking each question on its own"
+                    )
+                    outcomes = []
+                    for s_idx, (question, ground_truth) in enumerate(group):
+                        start = time.perf_counter()
+                        single = model_cascade.answer(
+                            load_prompt_template(
+                                "user_proxy", question=question, **context
+                            ),
+                            f"{idx}-{q_idx}-{s_idx}",
+                            question_deadline,
+                            data["id"],
                         )
-                    except BadRequestError as e:
-                        logger.error(
-                            f"An unexpected BadRequestError occurred for request {data['id']}: {e}"
+                        end = time.perf_counter()
+                        # The calls of the joint attempt are shared by its questions
+                        for key in ["llm_calls", "tier_prompt_tokens"]:
+                            single[key] = {
+                                tier: single[key].get(tier, 0)
+                                + result[key].get(tier, 0) / len(group)
+                                for tier in {**result[key], **single[key]}
+                            }
+                        outcomes.append(
+                            ([(question, ground_truth)], single, latency + end - start)
                         )
-                    except Exception as e:
-                        logger.error(
-                            f"An unexpected error occurred for request {data['id']}: {e}"
+
+                for answered_group, result, latency in outcomes:
+                    # Unanswered questions are kept as misses
+                    answers = result["answers"] or [None] * len(answered_group)
+
+                    # Split the answers back into one row per question
+                    for (question, ground_truth), answer in zip(
+                        answered_group, answers
+                    ):
+                        _id = data["id"]
+                        prediction = None if answer is None else answer.get("answer", 0)
+                        if verbose:
+                            logger.info(f"Record ID: {_id}")
+                            logger.info(f"Question: {question}")
+                            logger.info(f"Expected Answer: {ground_truth}")
+                            logger.info(f"Generated Answer: {prediction}")
+                            if cascade:
+                                logger.info(f"Answered by: {result['tier']}")
+                            logger.info("-" * 50)
+                        records.append(
+                            {
+                                "id": _id,
+                                "question": question,
+                                "ground_truth": ground_truth,
+                                "prediction": prediction,
+                                "latency": latency,
+                                "deadline_hit": bool(
+                                    question_deadline and question_deadline.hit
+                                ),
+                                "prompt_tokens": result["prompt_tokens"],
+                                "tier": result["tier"],
+                                "escalated": result["escalated"],
+                                "failed_signals": result["failed_signals"],
+                                "llm_calls": result["llm_calls"],
+                                "tier_prompt_tokens": result["tier_prompt_tokens"],
+                                "shared_by": len(answered_group),
+                                "joint_fallback": answered_group is not group,
+                                "error": result["error"],
+                            }
                         )
-                    _id = data["id"]
-                    prediction = parsed_content.get("answer", 0)
-                    if verbose:
-                        logger.info(f"Record ID: {_id}")
-                        logger.info(f"Question: {question}")
-                        logger.info(f"Expected Answer: {ground_truth}")
-                        logger.info(f"Generated Answer: {prediction}")
-                        logger.info("-" * 50)
-                    records.append(
-                        {
-                            "id": _id,
-                            "question": question,
-                            "ground_truth": ground_truth,
-                            "prediction": prediction,
-                            "latency": latency,
-                        }
-                    )
 
-            # Break after processing n records
-            if idx == n - 1:
+            # Stop once the metrics are estimated precisely enough
+            if sequential and intervals_converged(
+                [
+                    r["prediction"] is not None
+                    and numerical_match(r["ground_truth"], r["prediction"])
+                    for r in records
+                ],
+                [r["latency"] for r in records],
+                nm_ci_width,
+                p50_ci_width,
+                min_questions,
+            ):
+                logger.info(f"Confidence intervals converged after {idx + 1} records")
                 break
 
+        if profile:
+            profiler.stop()
+
         logger.info("Running evaluations")
 
         # Dataframe with question, ground_truth, and prediction
@@ -182,8 +339,11 @@ def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
         # Lambda for applying exact match
         em = lambda row: exact_match(row["ground_truth"], row["prediction"])
 
-        # Lambda for applying numerical match with units
-        nm = lambda row: numerical_match(row["ground_truth"], row["prediction"])
+        # Lambda for applying numerical match with units, misses never match
+        nm = lambda row: (
+            row["prediction"] is not None
+            and numerical_match(row["ground_truth"], row["prediction"])
+        )
 
         # Add evaluation metrics to output dataframe
         output_cols = ["ground_truth", "prediction"]
@@ -210,6 +370,12 @@ def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
         p95 = round(np.percentile(latencies, 95), 2)
         p99 = round(np.percentile(latencies, 99), 2)
 
+        # Confidence intervals of numerical match and median latency
+        nm_low, nm_high = proportion_interval(
+            int(output_df["numerical_match"].sum()), len(output_df)
+        )
+        p50_low, p50_high = median_interval(list(latencies))
+
         # Log metrics
         mlflow.log_metric("exact_match", exact_match_percentage)
         mlflow.log_metric("numerical_match", numerical_match_percentage)
@@ -221,10 +387,113 @@ def main(model: str, temperature: float, data_path: str, n: int, verbose: bool):
         mlflow.log_metric("p75", p75)
         mlflow.log_metric("p95", p95)
         mlflow.log_metric("p99", p99)
+        mlflow.log_metric("numerical_match_ci_low", round(nm_low * 100, 2))
+        mlflow.log_metric("numerical_match_ci_high", round(nm_high * 100, 2))
+        mlflow.log_metric("p50_ci_low", round(p50_low, 2))
+        mlflow.log_metric("p50_ci_high", round(p50_high, 2))
+        mlflow.log_metric("questions", len(output_df))
+        mlflow.log_metric("deadline_hits", int(output_df["deadline_hit"].sum()))
+        mlflow.log_metric("errors", int(output_df["error"].notna().sum()))
+        if joint_questions:
+            mlflow.log_metric("joint_fallbacks", int(output_df["joint_fallback"].sum()))
+        if hedge:
+            mlflow.log_metric("hedged_requests", sum(r.hedged for r in hedged))
+            mlflow.log_metric("hedge_wins", sum(r.hedge_wins for r in hedged))
+
+        # Prompt tokens per round, a round being an answer and its critique
+        round_tokens = pd.DataFrame(
+            [
+                [sum(tokens[i : i + 2]) for i in range(0, len(tokens), 2)]
+                for tokens in output_df["prompt_tokens"]
+            ]
+        )
+        for round_number, tokens in round_tokens.mean().items():
+            mlflow.log_metric("round_prompt_tokens", tokens, step=round_number + 1)
+
+        # Calls and prompt tokens of a conversation are shared by its questions
+        output_df["question_llm_calls"] = (
+            output_df["llm_calls"].map(lambda c: sum(c.values()))
+            / output_df["shared_by"]
+        )
+        output_df["question_prompt_tokens"] = (
+            output_df["tier_prompt_tokens"].map(lambda t: sum(t.values()))
+            / output_df["shared_by"]
+        )
+        mlflow.log_metric(
+            "total_prompt_tokens",
+            round(float(output_df["question_prompt_tokens"].sum())),
+        )
+        mlflow.log_metric(
+            "total_llm_calls", round(float(output_df["question_llm_calls"].sum()))
+        )
+        mlflow.log_metric(
+            "llm_calls_per_question", round(output_df["question_llm_calls"].mean(), 2)
+        )
+        mlflow.log_metric(
+            "prompt_tokens_per_question",
+            round(output_df["question_prompt_tokens"].mean(), 2),
+        )
+
+        # Calls per tier, escalations, and accuracy and latency of each tier
+        if cascade:
+            for tier in tiers:
+                calls = (
+                    output_df["llm_calls"].map(lambda c: c.get(tier.name, 0))
+                    / output_df["shared_by"]
+                )
+                mlflow.log_metric(f"tier_calls_{tier.name}", round(float(calls.sum())))
+                answered = output_df[output_df["tier"] == tier.name]
+                mlflow.log_metric(f"tier_questions_{tier.name}", len(answered))
+                if len(answered):
+                    mlflow.log_metric(
+                        f"numerical_match_{tier.name}",
+                        round(answered["numerical_match"].mean() * 100, 2),
+                    )
+                    mlflow.log_metric(
+                        f"mean_latency_{tier.name}",
+                        round(answered["latency"].mean(), 2),
+                    )
+            escalation_rate = round(output_df["escalated"].mean() * 100, 2)
+            logger.info(f"Escalation rate: {escalation_rate}%")
+            mlflow.log_metric("escalation_rate", escalation_rate)
+            mlflow.log_metric(
+                "escalation_errors", int((output_df["error"] == "escalation").sum())
+            )
+
+        # Calls, errors and ejections of each pooled endpoint
+        if pools:
+            pool_df = pd.DataFrame(
+                [stats for model_pool in pools.values() for stats in model_pool.stats()]
+            )
+            mlflow.log_metric("pool_errors", int(pool_df["errors"].sum()))
+            mlflow.log_metric("pool_ejections", int(pool_df["ejections"].sum()))
+            mlflow.log_table(pool_df, "pool.json")
 
         # Log data
         mlflow.log_table(output_df, "output.json")
 
+        # Log profile
+        if profile:
+            # Summed over threads, so both can exceed the wall time
+            local_seconds = round(profiler.seconds[LOCAL], 2)
+            llm_wait_seconds = round(profiler.seconds[LLM_WAIT], 2)
+            wall_seconds = round(profiler.wall_seconds, 2)
+            logger.info(
+                f"Local time: {local_seconds} thread-s, "
+                f"LLM wait: {llm_wait_seconds} thread-s, wall time: {wall_seconds}s"
+            )
+            mlflow.log_metric("profile_local_thread_seconds", local_seconds)
+            mlflow.log_metric("profile_llm_wait_thread_seconds", llm_wait_seconds)
+            mlflow.log_metric("profile_wall_seconds", wall_seconds)
+
+            hotspots_df = pd.DataFrame(profiler.hotspots())
+            mlflow.log_table(hotspots_df, "profile/hotspots.json")
+            mlflow.log_text(hotspots_df.to_string(index=False), "profile/hotspots.txt")
+            mlflow.log_text(profiler.folded(), "profile/stacks.folded")
+            mlflow.log_text(
+                render_flamegraph(profiler.stacks), "profile/flamegraph.svg"
+            )
+
 
 if __name__ == "__main__":
     arg_parser = argparse.ArgumentParser(
@@ -248,17 +517,218 @@ if __name__ == "__main__":
     arg_parser.add_argument(
         "--n",
         type=int,
-        default=10,
+        default=None,
         required=False,
-        help="Number of records to be processed.",
+        help=(
+            "Number of records to be processed. Defaults to 10, or to all "
+            "records with --sequential."
+        ),
     )
 
     arg_parser.add_argument(
         "--verbose", action="store_true", help="Enable verbose mode."
     )
 
+    arg_parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        required=False,
+        help="Latency budget per question in seconds.",
+    )
+
+    arg_parser.add_argument(
+        "--hedge",
+        action="store_true",
+        help="Send a duplicate LLM request when the first one exceeds the p90.",
+    )
+
+    arg_parser.add_argument(
+        "--compact-state",
+        action="store_true",
+        help="Keep only the context, latest answer and latest critique in the state.",
+    )
+
+    arg_parser.add_argument(
+        "--summarize-rounds",
+        action="store_true",
+        help="Summarize answers of earlier rounds when using --compact-state.",
+    )
+
+    arg_parser.add_argument(
+        "--sample",
+        type=str,
+        choices=SAMPLE_STRATEGIES,
+        default="head",
+        required=False,
+        help="Strategy used to select the n records.",
+    )
+
+    arg_parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        required=False,
+        help="Random seed for sampling.",
+    )
+
+    arg_parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="Stop once the confidence intervals are narrower than the targets.",
+    )
+
+    arg_parser.add_argument(
+        "--nm-ci-width",
+        type=float,
+        default=10.0,
+        required=False,
+        help="Target width of the numerical match interval in percentage points.",
+    )
+
+    arg_parser.add_argument(
+        "--p50-ci-width",
+        type=float,
+        default=2.0,
+        required=False,
+        help="Target width of the median latency interval in seconds.",
+    )
+
+    arg_parser.add_argument(
+        "--min-questions",
+        type=int,
+        default=30,
+        required=False,
+        help="Minimum number of questions before a sequential run can stop.",
+    )
+
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile local time against LLM wait time and log a flame graph.",
+    )
+
+    arg_parser.add_argument(
+        "--ids",
+        type=str,
+        nargs="+",
+        default=None,
+        required=False,
+        help="Ids of the records to process, overriding --n and --sample.",
+    )
+
+    arg_parser.add_argument(
+        "--ids-file",
+        type=str,
+        default=None,
+        required=False,
+        help="File with record ids, or output table of a run to retry failures.",
+    )
+
+    arg_parser.add_argument(
+        "--start",
+        type=int,
+        default=None,
+        required=False,
+        help="Position of the first record to process.",
+    )
+
+    arg_parser.add_argument(
+        "--stop",
+        type=int,
+        default=None,
+        required=False,
+        help="Position after the last record to process.",
+    )
+
+    arg_parser.add_argument(
+        "--cascade",
+        type=str,
+        nargs="+",
+        default=None,
+        required=False,
+        help="Cheaper models answering first, escalating up to --model.",
+    )
+
+    arg_parser.add_argument(
+        "--critic-model",
+        type=str,
+        default=None,
+        required=False,
+        help="The name of the critic model, defaults to the analyst model.",
+    )
+
+    arg_parser.add_argument(
+        "--cascade-signals",
+        type=str,
+        nargs="+",
+        choices=CONFIDENCE_SIGNALS,
+        default=["critic", "parse"],
+        required=False,
+        help="Confidence signals an answer must pass to avoid escalation.",
+    )
+
+    arg_parser.add_argument(
+        "--pool",
+        type=str,
+        default=None,
+        required=False,
+        help="JSON file with the Azure OpenAI deployments of each model.",
+    )
+
+    arg_parser.add_argument(
+        "--pool-strategy",
+        type=str,
+        choices=POOL_STRATEGIES,
+        default="least-outstanding",
+        required=False,
+        help="Strategy used to spread calls across the deployments of a model.",
+    )
+
+    arg_parser.add_argument(
+        "--joint-questions",
+        action="store_true",
+        help="Answer all questions of a record in a single conversation.",
+    )
+
     # Parse arguments
     args = arg_parser.parse_args()
 
+    # Sequential runs stop on their own, so they may go through every record
+    if args.n is None and not args.sequential:
+        args.n = 10
+    if args.sequential and args.n is not None and args.n < args.min_questions:
+        arg_parser.error(
+            f"--n {args.n} is below --min-questions {args.min_questions}, "
+            "the sequential run could never stop early."
+        )
+
     # Pass parsed arguments to the async function
-    main(args.model, args.temperature, args.data_path, args.n, args.verbose)
+    main(
+        args.model,
+        args.temperature,
+        args.data_path,
+        args.n,
+        args.verbose,
+        args.deadline,
+        args.hedge,
+        args.compact_state,
+        args.summarize_rounds,
+        args.sample,
+        args.seed,
+        args.sequential,
+        args.nm_ci_width,
+        args.p50_ci_width,
+        args.min_questions,
+        args.profile,
+        args.ids,
+        args.ids_file,
+        args.start,
+        args.stop,
+        args.cascade,
+        args.critic_model,
+        args.cascade_signals,
+        args.pool,
+        args.pool_strategy,
+        args.joint_questions,
+    )
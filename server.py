@@ -0,0 +1,139 @@
+"""Script for serving the financial analysis workflow over HTTP."""
+
+import argparse
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from src.fin_qa import setup_logger
+from src.fin_qa.agents import FinancialAnalysisAgents
+from src.fin_qa.arguments import temperature_range
+from src.fin_qa.graph import FinancialAnalysisGraph
+from src.fin_qa.latency import LatencyTracker
+from src.fin_qa.pool import POOL_STRATEGIES, load_pools
+from src.fin_qa.service import QAService, create_app
+
+logger = setup_logger(__file__)
+
+
+def main(
+    model: str,
+    temperature: float,
+    host: str,
+    port: int,
+    max_concurrency: int,
+    max_queue: int,
+    batch_window: float,
+    deadline: float | None = None,
+    compact_state: bool = False,
+    pool: str | None = None,
+    pool_strategy: str = "least-outstanding",
+):
+    """
+    Build the agents and graph once and serve questions until interrupted.
+    """
+
+    # Load environment variables
+    load_dotenv()
+
+    pools = load_pools(pool, pool_strategy) if pool else None
+    generate, reflect, parser = FinancialAnalysisAgents.create_agents(
+        model=model, temperature=temperature, pools=pools
+    )
+    graph = FinancialAnalysisGraph.create_graph(
+        generate, reflect, LatencyTracker(), compact=compact_state, checkpoint=False
+    )
+
+    service = QAService(
+        graph,
+        parser,
+        max_concurrency=max_concurrency,
+        max_queue=max_queue,
+        batch_window=batch_window,
+        deadline=deadline,
+    )
+
+    logger.info(f"Serving model {model} on http://{host}:{port}")
+    web.run_app(create_app(service), host=host, port=port, print=None)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Serve the financial analysis workflow over HTTP."
+    )
+
+    arg_parser.add_argument(
+        "--model", type=str, required=True, help="The name of the model to use."
+    )
+    arg_parser.add_argument(
+        "--temperature",
+        type=temperature_range,
+        required=True,
+        help="The temperature setting (must be between 0.0 and 1.0).",
+    )
+    arg_parser.add_argument(
+        "--host", type=str, default="127.0.0.1", help="Host to listen on."
+    )
+    arg_parser.add_argument("--port", type=int, default=8080, help="Port to listen on.")
+    arg_parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=4,
+        help="Maximum number of questions answered concurrently.",
+    )
+    arg_parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=32,
+        help="Maximum number of questions waiting before requests are rejected.",
+    )
+    arg_parser.add_argument(
+        "--batch-window",
+        type=float,
+        default=0.01,
+        help=(
+            "Time in seconds to wait for requests on the same document, whose "
+            "context is rendered once and identical questions run once."
+        ),
+    )
+    arg_parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        help="Latency budget per question in seconds.",
+    )
+    arg_parser.add_argument(
+        "--compact-state",
+        action="store_true",
+        help="Keep only the context, latest answer and latest critique in the state.",
+    )
+
+    arg_parser.add_argument(
+        "--pool",
+        type=str,
+        default=None,
+        help="JSON file with the Azure OpenAI deployments of each model.",
+    )
+    arg_parser.add_argument(
+        "--pool-strategy",
+        type=str,
+        choices=POOL_STRATEGIES,
+        default="least-outstanding",
+        help="Strategy used to spread calls across the deployments of a model.",
+    )
+
+    args = arg_parser.parse_args()
+
+    main(
+        args.model,
+        args.temperature,
+        args.host,
+        args.port,
+        args.max_concurrency,
+        args.max_queue,
+        args.batch_window,
+        args.deadline,
+        args.compact_state,
+        args.pool,
+        args.pool_strategy,
+    )
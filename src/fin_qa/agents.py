@@ -3,10 +3,12 @@
 from langchain.output_parsers import RetryOutputParser
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables import ConfigurableField
 from langchain_openai import AzureChatOpenAI
 from pydantic import BaseModel, Field
 
 from src.fin_qa.data_loader import load_prompt_template
+from src.fin_qa.pool import EndpointPool, PooledChatModel
 
 STOP_AFTER_ATTEMPT = 3
 WAIT_EXPONENTIAL_JITTER = True
@@ -48,14 +50,18 @@ class FinancialAnalysisAgents:
         )
 
     @staticmethod
-    def get_critic_prompt() -> ChatPromptTemplate:
+    def get_critic_prompt(batch: bool = False) -> ChatPromptTemplate:
         """
         Create a system prompt for the critic agent.
 
+        Args:
+            batch (bool, optional): Ask the critic to review the answers of
+                several questions asked together. Defaults to False.
+
         Returns:
             ChatPromptTemplate: Configured prompt for critical analysis.
         """
-        critic_system_message = load_prompt_template("critic")
+        critic_system_message = load_prompt_template("critic", batch=batch)
 
         return ChatPromptTemplate.from_messages(
             [
@@ -64,19 +70,59 @@ class FinancialAnalysisAgents:
             ]
         )
 
+    @staticmethod
+    def create_llm(
+        model: str,
+        temperature: float,
+        pools: dict[str, EndpointPool] | None = None,
+    ) -> AzureChatOpenAI | PooledChatModel:
+        """
+        Create the LLM for an agent.
+
+        Args:
+            model (str): LLM model to use.
+            temperature (float): Sampling temperature.
+            pools (dict[str, EndpointPool], optional): Endpoint pool of each
+                model. Models without a pool use the endpoint configured in the
+                environment. Defaults to None.
+
+        Returns:
+            AzureChatOpenAI | PooledChatModel: Configured LLM.
+        """
+        if pools and model in pools:
+            return PooledChatModel(pools[model], temperature)
+        return AzureChatOpenAI(model=model, temperature=temperature)
+
     @classmethod
-    def create_agents(cls, model: str = "gpt-4o", temperature: float = 0.0):
+    def create_agents(
+        cls,
+        model: str = "gpt-4o",
+        temperature: float = 0.0,
+        critic_model: str | None = None,
+        pools: dict[str, EndpointPool] | None = None,
+    ):
         """
         Create agents for financial analysis workflow.
 
+        The critic reviews a single question by default. Runs setting
+        `critic` to "batch" in the configurable section of their config use
+        the critic prompt for several questions asked together.
+
         Args:
             model (str, optional): LLM model to use. Defaults to "gpt-4o".
             temperature (float, optional): Sampling temperature. Defaults to 0.0.
+            critic_model (str, optional): LLM model of the critic agent.
+                Defaults to the model of the financial analyst agent.
+            pools (dict[str, EndpointPool], optional): Endpoint pool of each
+                model, shared by all agents. Defaults to None.
 
         Returns:
             Tuple containing parser, generator, and reflection agents.
         """
-        llm = AzureChatOpenAI(model=model, temperature=temperature)
+        llm = cls.create_llm(model, temperature, pools)
+        critic_llm = (
+            cls.create_llm(critic_model, temperature, pools) if critic_model else llm
+        )
 
         parser = JsonOutputParser(pydantic_object=StepsAndAnswer)
         retry_parser = RetryOutputParser.from_llm(parser=parser, llm=llm)
@@ -86,9 +132,14 @@ class FinancialAnalysisAgents:
             wait_exponential_jitter=WAIT_EXPONENTIAL_JITTER,
         )
 
-        reflect = cls.get_critic_prompt() | llm.with_retry(
+        critic_llm = critic_llm.with_retry(
             stop_after_attempt=STOP_AFTER_ATTEMPT,
             wait_exponential_jitter=WAIT_EXPONENTIAL_JITTER,
         )
+        reflect = (cls.get_critic_prompt() | critic_llm).configurable_alternatives(
+            ConfigurableField(id="critic"),
+            default_key="single",
+            batch=cls.get_critic_prompt(batch=True) | critic_llm,
+        )
 
         return generate, reflect, retry_parser
@@ -0,0 +1,20 @@
+"""Module with argument types shared by the command line scripts."""
+
+import argparse
+
+
+def temperature_range(value: str) -> float:
+    """
+    Validate that the temperature is between 0.0 and 1.0.
+    """
+    try:
+        temp = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a valid float.")
+
+    if not (0.0 <= temp <= 1.0):
+        raise argparse.ArgumentTypeError(
+            f"Temperature must be between 0.0 and 1.0, got {value}."
+        )
+
+    return temp
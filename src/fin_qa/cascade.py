@@ -0,0 +1,407 @@
+"""Module for answering questions with a cascade of cheaper to stronger models."""
+
+from typing import Any
+
+from langchain.prompts import PromptTemplate
+from langchain_community.callbacks import get_openai_callback
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from openai import BadRequestError
+
+from src.fin_qa import setup_logger
+from src.fin_qa.data_conversion import fix_invalid_json
+from src.fin_qa.evaluate import numerical_match
+from src.fin_qa.latency import Deadline
+
+logger = setup_logger(__file__)
+
+CONFIDENCE_SIGNALS = ["critic", "parse", "agreement"]
+CRITIC_APPROVAL = "ALL_OK"
+
+
+def split_answers(parsed: Any, questions: int = 1) -> list[dict[str, Any]] | None:
+    """
+    Split a parsed analyst answer into the answers of each question.
+
+    Args:
+        parsed (Any): Parsed analyst answer, an object for a single question or
+            an array with one object per question.
+        questions (int, optional): Number of questions asked. Defaults to 1.
+
+    Returns:
+        list[dict[str, Any]] | None: Answer of each question in order, None if
+            the answer does not match the number of questions.
+    """
+    answers = [parsed] if isinstance(parsed, dict) else parsed
+    if not isinstance(answers, list) or len(answers) != questions:
+        return None
+    if not all(isinstance(answer, dict) and "answer" in answer for answer in answers):
+        return None
+    return answers
+
+
+class CascadeTier:
+    """
+    Model of the cascade with its compiled graph and parser.
+
+    Attributes:
+        name (str): Tier name, usually the analyst model.
+        graph: Compiled financial analysis graph.
+        parser: Parser for the final analyst answer.
+        generate: Financial analyst agent, used to draw a second sample.
+        reflect: Critic agent, used to review the final answer.
+    """
+
+    def __init__(self, name: str, graph, parser, generate, reflect):
+        self.name = name
+        self.graph = graph
+        self.parser = parser
+        self.generate = generate
+        self.reflect = reflect
+
+    def run(
+        self,
+        user_proxy_message: str,
+        config: dict[str, Any],
+        record_id: str = "",
+        retry: bool = True,
+        questions: int = 1,
+    ) -> dict[str, Any] | None:
+        """
+        Answer the questions of a message with the graph of the tier.
+
+        Args:
+            user_proxy_message (str): Questions with their document context.
+            config (dict[str, Any]): Run configuration.
+            record_id (str, optional): Record id used in error logs.
+            retry (bool, optional): Ask the LLM to fix an answer that cannot be
+                parsed. Defaults to True.
+            questions (int, optional): Number of questions asked. Defaults to 1.
+
+        Returns:
+            dict[str, Any] | None: Final analyst message, answer of each question
+                (None if it could not be parsed), whether it parsed without a
+                retry, the graph state, and LLM calls and prompt tokens spent
+                fixing the answer. None if the graph failed.
+        """
+        try:
+            response = self.graph.invoke(
+                {"messages": [HumanMessage(content=user_proxy_message)]}, config
+            )
+        except BadRequestError as e:
+            logger.error(
+                f"An unexpected BadRequestError occurred for request {record_id}: {e}"
+            )
+            return None
+        except Exception as e:
+            logger.error(f"An unexpected error occurred for request {record_id}: {e}")
+            return None
+
+        ai_messages = [
+            x.content for x in response["messages"] if isinstance(x, AIMessage)
+        ]
+        if not ai_messages:
+            return None
+        content = ai_messages[-1]
+
+        answers = self.parse(content, questions)
+        strict = answers is not None
+        retry_calls = retry_tokens = 0
+        if answers is None and retry:
+            answers, retry_calls, retry_tokens = self.retry_parse(
+                content, user_proxy_message, record_id, questions, config
+            )
+
+        return {
+            "content": content,
+            "answers": answers,
+            "strict": strict,
+            "response": response,
+            "retry_calls": retry_calls,
+            "retry_tokens": retry_tokens,
+        }
+
+    def retry_parse(
+        self,
+        content: str,
+        user_proxy_message: str,
+        record_id: str = "",
+        questions: int = 1,
+        config: dict[str, Any] | None = None,
+    ) -> tuple[list[dict[str, Any]] | None, int, int]:
+        """
+        Parse an analyst answer, asking the LLM to fix it if needed.
+
+        Args:
+            content (str): Analyst message content.
+            user_proxy_message (str): Questions with their document context.
+            record_id (str, optional): Record id used in error logs.
+            questions (int, optional): Number of questions asked. Defaults to 1.
+            config (dict[str, Any], optional): Run configuration of the
+                conversation, passed on to the LLM fixing the answer.
+                Defaults to None.
+
+        Returns:
+            tuple[list[dict[str, Any]] | None, int, int]: Answer of each
+                question (None if the answer could not be fixed), and LLM calls
+                and prompt tokens spent fixing it.
+        """
+        prompt_value = PromptTemplate(template=user_proxy_message).format_prompt()
+        # The retry chain of the parser takes no config, it inherits the one of
+        # the wrapping runnable
+        parse = RunnableLambda(
+            lambda completion: self.parser.parse_with_prompt(completion, prompt_value)
+        )
+        answers = None
+        # The retry chain of the parser calls the LLM outside of the graph
+        with get_openai_callback() as usage:
+            try:
+                answers = split_answers(
+                    parse.invoke(fix_invalid_json(content), config), questions
+                )
+            except BadRequestError as e:
+                logger.error(
+                    "An unexpected BadRequestError occurred for request "
+                    f"{record_id}: {e}"
+                )
+            except Exception as e:
+                logger.error(
+                    f"An unexpected error occurred for request {record_id}: {e}"
+                )
+        return answers, usage.successful_requests, usage.prompt_tokens
+
+    def parse(self, content: str, questions: int = 1) -> list[dict[str, Any]] | None:
+        """
+        Parse an analyst answer without asking the LLM to fix it.
+
+        Args:
+            content (str): Analyst message content.
+            questions (int, optional): Number of questions asked. Defaults to 1.
+
+        Returns:
+            list[dict[str, Any]] | None: Answer of each question, None if the
+                content is not valid JSON with an answer per question.
+        """
+        parser = getattr(self.parser, "parser", self.parser)
+        try:
+            parsed = parser.parse(fix_invalid_json(content))
+        except Exception:
+            return None
+        return split_answers(parsed, questions)
+
+
+class ModelCascade:
+    """
+    Cascade answering with the cheapest model first and escalating to the next
+    model when the answer fails a confidence signal.
+
+    Signals are "critic" (the critic approves the final answer), "parse"
+    (the answer parsed without a retry) and "agreement" (a second sample of the
+    analyst gives the same numbers). The last tier is always accepted.
+
+    Attributes:
+        tiers (list[CascadeTier]): Tiers from the cheapest to the strongest.
+        signals (list[str]): Confidence signals an answer must pass.
+    """
+
+    def __init__(self, tiers: list[CascadeTier], signals: list[str] | None = None):
+        if not tiers:
+            raise ValueError("A cascade needs at least one tier.")
+        signals = ["critic", "parse"] if signals is None else signals
+        unknown = [signal for signal in signals if signal not in CONFIDENCE_SIGNALS]
+        if unknown:
+            raise ValueError(f"Unknown confidence signals: {', '.join(unknown)}.")
+        self.tiers = tiers
+        self.signals = signals
+
+    def answer(
+        self,
+        user_proxy_message: str,
+        thread_id: str,
+        deadline: Deadline | None = None,
+        record_id: str = "",
+        questions: int = 1,
+    ) -> dict[str, Any]:
+        """
+        Answer the questions of a message, escalating through the tiers until
+        one is confident.
+
+        No tier is escalated to once the deadline is spent.
+
+        Args:
+            user_proxy_message (str): Questions with their document context.
+            thread_id (str): Conversation id, suffixed with the tier name.
+            deadline (Deadline, optional): Latency budget of the questions.
+                Defaults to None.
+            record_id (str, optional): Record id used in error logs.
+            questions (int, optional): Number of questions asked together.
+                Defaults to 1.
+
+        Returns:
+            dict[str, Any]: Accepted tier, answer of each question (None if
+                unanswered), whether the message was escalated, signals failed
+                by the rejected tiers, prompt tokens of each call of the
+                accepted tier, LLM calls and prompt tokens spent on each tier,
+                and the error that left the questions unanswered ("graph" when
+                no tier answered, "parse" when the answer could not be parsed,
+                "escalation" when the answer is that of a rejected tier because
+                the tier escalated to failed).
+        """
+        result = None
+        escalated = False
+        failed_signals = []
+        calls = {}
+        tokens = {}
+
+        for position, tier in enumerate(self.tiers):
+            last = position == len(self.tiers) - 1
+            config = {
+                "configurable": {
+                    "thread_id": f"{thread_id}-{tier.name}",
+                    "deadline": deadline,
+                    # Questions asked together are reviewed by the batch critic
+                    "critic": "batch" if questions > 1 else "single",
+                }
+            }
+            run = tier.run(
+                user_proxy_message,
+                config,
+                record_id,
+                retry=last or "parse" not in self.signals,
+                questions=questions,
+            )
+
+            if run is not None:
+                prompt_tokens = run["response"].get("prompt_tokens", [])
+                calls[tier.name] = (
+                    calls.get(tier.name, 0) + len(prompt_tokens) + run["retry_calls"]
+                )
+                tokens[tier.name] = (
+                    tokens.get(tier.name, 0) + sum(prompt_tokens) + run["retry_tokens"]
+                )
+                result = {
+                    "tier": tier.name,
+                    "answers": run["answers"],
+                    "prompt_tokens": prompt_tokens,
+                }
+
+            if last:
+                break
+            if deadline is not None and not deadline.allows(0.0):
+                if run is not None and run["answers"] is None:
+                    result["answers"], retry_calls, retry_tokens = tier.retry_parse(
+                        run["content"], user_proxy_message, record_id, questions, config
+                    )
+                    calls[tier.name] += retry_calls
+                    tokens[tier.name] += retry_tokens
+                break
+
+            failed = (
+                ["graph"]
+                if run is None
+                else self.failed_signals(
+                    tier, run, user_proxy_message, calls, tokens, questions, config
+                )
+            )
+            if not failed:
+                break
+            failed_signals += [f"{tier.name}:{signal}" for signal in failed]
+            escalated = True
+
+        # Unanswered questions are reported so they count as misses
+        error = None
+        if result is None:
+            error = "graph"
+            result = {"tier": tier.name, "answers": None, "prompt_tokens": []}
+        elif result["answers"] is None:
+            error = "parse"
+        elif run is None:
+            # The tier escalated to failed, the answer is one that was rejected
+            error = "escalation"
+        return {
+            **result,
+            "escalated": escalated,
+            "failed_signals": failed_signals,
+            "llm_calls": calls,
+            "tier_prompt_tokens": tokens,
+            "error": error,
+        }
+
+    def failed_signals(
+        self,
+        tier: CascadeTier,
+        run: dict[str, Any],
+        user_proxy_message: str,
+        calls: dict[str, int],
+        tokens: dict[str, int],
+        questions: int = 1,
+        config: dict[str, Any] | None = None,
+    ) -> list[str]:
+        """
+        Check an answer against the confidence signals of the cascade.
+
+        Args:
+            tier (CascadeTier): Tier that produced the answer.
+            run (dict[str, Any]): Result of the tier run.
+            user_proxy_message (str): Questions with their document context.
+            calls (dict[str, int]): LLM calls per tier, updated with the calls
+                made to review the final answer and to draw a second sample.
+            tokens (dict[str, int]): Prompt tokens per tier, updated likewise.
+            questions (int, optional): Number of questions asked. Defaults to 1.
+            config (dict[str, Any], optional): Run configuration of the tier,
+                so the extra calls stay in its conversation. Defaults to None.
+
+        Returns:
+            list[str]: Signals the answer failed, empty if it is confident.
+        """
+        failed = []
+
+        if "parse" in self.signals and not run["strict"]:
+            failed.append("parse")
+
+        if "critic" in self.signals:
+            # The graph ends on an answer, so the critic has not reviewed it yet
+            calls[tier.name] += 1
+            try:
+                critique = tier.reflect.invoke(
+                    [
+                        run["response"]["messages"][0],
+                        HumanMessage(content=run["content"]),
+                    ],
+                    config,
+                )
+            except Exception as e:
+                logger.error(f"Review of tier {tier.name} failed: {e}")
+                critique = None
+            if critique is not None:
+                usage = getattr(critique, "usage_metadata", None) or {}
+                tokens[tier.name] += usage.get("input_tokens", 0)
+            if critique is None or CRITIC_APPROVAL not in critique.content:
+                failed.append("critic")
+
+        if "agreement" in self.signals:
+            calls[tier.name] += 1
+            try:
+                sample = tier.generate.invoke(
+                    [HumanMessage(content=user_proxy_message)], config
+                )
+            except Exception as e:
+                logger.error(f"Second sample of tier {tier.name} failed: {e}")
+                sample = None
+            others = None
+            if sample is not None:
+                usage = getattr(sample, "usage_metadata", None) or {}
+                tokens[tier.name] += usage.get("input_tokens", 0)
+                others = tier.parse(sample.content, questions)
+            # Every question must get the same number from both samples
+            if (
+                run["answers"] is None
+                or others is None
+                or not all(
+                    numerical_match(answer["answer"], other["answer"])
+                    for answer, other in zip(run["answers"], others)
+                )
+            ):
+                failed.append("agreement")
+
+        return failed
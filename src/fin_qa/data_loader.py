@@ -1,16 +1,27 @@
 """Module for loading and processing financial data."""
 
 import json
-from collections.abc import Generator
+import os
+import re
+from collections.abc import Generator, Iterable
 from pathlib import Path
 from typing import Any
 
+import pandas as pd
 from jinja2 import Environment, FileSystemLoader
 
+from src.fin_qa import setup_logger
+
+logger = setup_logger(__file__)
+
 current_dir = Path(__file__).parent.parent
 prompt_dir = str(current_dir.parent / "prompts")
 environment = Environment(loader=FileSystemLoader(prompt_dir), autoescape=True)
 
+INDEX_SUFFIX = ".idx"
+STRUCTURE_PATTERN = re.compile(rb'[\[\]{}"]')
+STRING_END_PATTERN = re.compile(rb'["\\]')
+
 
 def load_financial_data(file_path: str) -> Generator[dict[str, Any]]:
     """
@@ -48,3 +59,180 @@ def load_prompt_template(template_name: str, **kwargs):
     template = environment.get_template(f"{template_name}.j2")
     content = template.render(**kwargs)
     return content
+
+
+def scan_record_offsets(data: bytes) -> list[tuple[int, int]]:
+    """
+    Find the byte offsets of the objects in a JSON array.
+
+    Args:
+        data (bytes): Content of a JSON file holding an array of objects.
+
+    Returns:
+        list[tuple[int, int]]: Start and end offsets of each object.
+    """
+    offsets = []
+    depth = 0
+    start = 0
+    pos = 0
+    while match := STRUCTURE_PATTERN.search(data, pos):
+        char = match.group()
+        pos = match.end()
+        if char == b'"':
+            # Skip the string, including escaped characters
+            while string_end := STRING_END_PATTERN.search(data, pos):
+                pos = string_end.end()
+                if string_end.group() == b'"':
+                    break
+                pos += 1
+        elif char in b"[{":
+            if depth == 1:
+                start = match.start()
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1:
+                offsets.append((start, pos))
+    return offsets
+
+
+class RecordIndex:
+    """
+    Sidecar index mapping record ids to byte offsets in a JSON data file.
+
+    The index is stored next to the data file and rebuilt when the data file
+    changes, so any record can be loaded by seeking to it.
+
+    Attributes:
+        file_path (str): Path to the JSON data file.
+        ids (list[str]): Record ids in file order.
+        offsets (list[tuple[int, int]]): Start and end offsets of each record.
+        positions (dict[str, int]): Position of each record id.
+    """
+
+    def __init__(self, file_path: str, ids: list[str], offsets: list[tuple[int, int]]):
+        self.file_path = file_path
+        self.ids = ids
+        self.offsets = offsets
+        self.positions = {record_id: i for i, record_id in enumerate(ids)}
+
+    @staticmethod
+    def index_path(file_path: str) -> Path:
+        """
+        Path of the sidecar index of a data file.
+
+        Args:
+            file_path (str): Path to the JSON data file.
+
+        Returns:
+            Path: Path to the index file.
+        """
+        return Path(f"{file_path}{INDEX_SUFFIX}")
+
+    @classmethod
+    def build(cls, file_path: str) -> "RecordIndex":
+        """
+        Build the index of a data file and write it next to the file.
+
+        Args:
+            file_path (str): Path to the JSON data file.
+
+        Returns:
+            RecordIndex: Index of the data file.
+        """
+        with open(file_path, "rb") as file:
+            stat = os.fstat(file.fileno())
+            data = file.read()
+
+        offsets = scan_record_offsets(data)
+        ids = [json.loads(data[start:end])["id"] for start, end in offsets]
+        index = cls(file_path, ids, offsets)
+
+        content = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "ids": ids,
+            "offsets": offsets,
+        }
+        try:
+            with open(cls.index_path(file_path), "w", encoding="utf-8") as file:
+                json.dump(content, file)
+        except OSError as e:
+            print(f"Error writing index for {file_path}: {e}")
+        return index
+
+    @classmethod
+    def load(cls, file_path: str) -> "RecordIndex":
+        """
+        Load the index of a data file, building it if missing or stale.
+
+        Args:
+            file_path (str): Path to the JSON data file.
+
+        Returns:
+            RecordIndex: Index of the data file.
+        """
+        stat = os.stat(file_path)
+        try:
+            with open(cls.index_path(file_path), encoding="utf-8") as file:
+                content = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return cls.build(file_path)
+
+        if content["size"] != stat.st_size or content["mtime_ns"] != stat.st_mtime_ns:
+            return cls.build(file_path)
+        offsets = [tuple(offset) for offset in content["offsets"]]
+        return cls(file_path, content["ids"], offsets)
+
+    def read(self, ids: Iterable[str]) -> Generator[dict[str, Any]]:
+        """
+        Load records by id, seeking to each of them.
+
+        Args:
+            ids (Iterable[str]): Record ids.
+
+        Yields:
+            dict[str, Any]: Records found in the data file.
+        """
+        with open(self.file_path, "rb") as file:
+            for record_id in ids:
+                position = self.positions.get(record_id)
+                if position is None:
+                    logger.warning(f"Record {record_id} not found in {self.file_path}")
+                    continue
+                start, end = self.offsets[position]
+                file.seek(start)
+                yield json.loads(file.read(end - start))
+
+
+def read_ids_file(file_path: str) -> list[tuple[str, str | None]]:
+    """
+    Read record ids, and the questions to ask, from a file.
+
+    Args:
+        file_path (str): Either a text file with one record id per line, or the
+            output table of a previous run as CSV or MLflow JSON. For output
+            tables with a `numerical_match` column, only failed questions are
+            returned.
+
+    Returns:
+        list[tuple[str, str | None]]: Unique record ids and questions in file
+            order, the question being None when every question of the record
+            is requested.
+    """
+    suffix = Path(file_path).suffix
+    if suffix in [".csv", ".json"]:
+        if suffix == ".csv":
+            output_df = pd.read_csv(file_path)
+        else:
+            output_df = pd.read_json(file_path, orient="split")
+        if "numerical_match" in output_df:
+            output_df = output_df[~output_df["numerical_match"].astype(bool)]
+        if "question" in output_df:
+            pairs = zip(output_df["id"], output_df["question"])
+        else:
+            pairs = ((record_id, None) for record_id in output_df["id"])
+    else:
+        with open(file_path, encoding="utf-8") as file:
+            pairs = [(line.strip(), None) for line in file if line.strip()]
+    return list(dict.fromkeys(pairs))
@@ -1,5 +1,6 @@
 import math
 import re
+from statistics import NormalDist
 
 
 def extract_number(string):
@@ -62,3 +63,76 @@ def numerical_match(ground_truth: str, prediction: str):
     prediction = extract_number(str(prediction).strip())
     prediction_value = float(prediction) if prediction else 0
     return math.isclose(ground_truth_value, prediction_value, rel_tol=0, abs_tol=0.5)
+
+
+def proportion_interval(successes: int, n: int, confidence: float = 0.95):
+    """Computes the Wilson score interval for a proportion.
+
+    Args:
+        successes: Number of successes.
+        n: Number of trials.
+        confidence: Confidence level of the interval.
+
+    Returns:
+        tuple[float, float]: Lower and upper bounds of the proportion.
+    """
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / n
+    center = (p + z**2 / (2 * n)) / (1 + z**2 / n)
+    margin = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / (1 + z**2 / n)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def median_interval(values: list[float], confidence: float = 0.95):
+    """Computes a distribution-free confidence interval for the median.
+
+    Args:
+        values: Observed values.
+        confidence: Confidence level of the interval.
+
+    Returns:
+        tuple[float, float]: Lower and upper bounds of the median.
+
+    Note:
+        Uses the order statistics given by the normal approximation of the
+        binomial distribution, so no assumption is made on the distribution of
+        the values.
+    """
+    if not values:
+        return -math.inf, math.inf
+    ordered = sorted(values)
+    n = len(ordered)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    lower = math.floor(n / 2 - z * math.sqrt(n) / 2)
+    upper = math.ceil(n / 2 + z * math.sqrt(n) / 2)
+    return ordered[max(lower, 0)], ordered[min(upper, n - 1)]
+
+
+def intervals_converged(
+    matches: list[bool],
+    latencies: list[float],
+    nm_width: float,
+    p50_width: float,
+    min_samples: int = 30,
+    confidence: float = 0.95,
+):
+    """Checks whether a sequential evaluation can stop.
+
+    Args:
+        matches: Numerical match of each question answered so far.
+        latencies: Latency of each question answered so far.
+        nm_width: Target width of the numerical match interval in percentage points.
+        p50_width: Target width of the median latency interval in seconds.
+        min_samples: Minimum number of questions before stopping.
+        confidence: Confidence level of the intervals.
+
+    Returns:
+        bool: True if both intervals are narrower than their target width.
+    """
+    if len(matches) < min_samples:
+        return False
+    nm_low, nm_high = proportion_interval(sum(matches), len(matches), confidence)
+    p50_low, p50_high = median_interval(latencies, confidence)
+    return (nm_high - nm_low) * 100 < nm_width and p50_high - p50_low < p50_width
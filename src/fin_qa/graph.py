@@ -1,15 +1,59 @@
 """Module for creating and managing the financial analysis workflow graph."""
 
+import json
+import operator
+import time
 from typing import Annotated, TypedDict
 
 # import mlflow
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import add_messages
 
+from src.fin_qa.data_conversion import fix_invalid_json
+from src.fin_qa.latency import HedgedRunnable, LatencyTracker
+
 # mlflow.langchain.autolog()
 
+MAX_ROUNDS = 4
+
+
+def window_messages(left: list, right: list) -> list:
+    """
+    Merge messages keeping only the context, latest answer and latest critique.
+
+    Args:
+        left (list): Current messages.
+        right (list): New messages.
+
+    Returns:
+        list: Context message followed by the two most recent messages.
+    """
+    merged = add_messages(left, right)
+    if len(merged) > 3:
+        return [merged[0], *merged[-2:]]
+    return merged
+
+
+def summarize_answer(round_number: int, message: AIMessage) -> str:
+    """
+    Summarize an analyst answer in one line.
+
+    Args:
+        round_number (int): Round in which the answer was given.
+        message (AIMessage): Analyst answer.
+
+    Returns:
+        str: One-line summary with the final answer of the round.
+    """
+    try:
+        answer = json.loads(fix_invalid_json(message.content)).get("answer")
+    except (ValueError, AttributeError):
+        answer = message.content[:100]
+    return f"Round {round_number} answer: {answer}"
+
 
 class State(TypedDict):
     """
@@ -17,9 +61,30 @@ class State(TypedDict):
 
     Attributes:
         messages (list[Message]): List of messages in the conversation.
+        rounds (int): Number of answers generated.
+        prompt_tokens (list[int]): Prompt tokens of each LLM call.
     """
 
     messages: Annotated[list, add_messages]
+    rounds: Annotated[int, operator.add]
+    prompt_tokens: Annotated[list[int], operator.add]
+
+
+class CompactState(TypedDict):
+    """
+    State dictionary for the workflow graph keeping a window of the conversation.
+
+    Attributes:
+        messages (list[Message]): Context, latest answer and latest critique.
+        rounds (int): Number of answers generated.
+        summary (list[str]): One-line summaries of answers outside the window.
+        prompt_tokens (list[int]): Prompt tokens of each LLM call.
+    """
+
+    messages: Annotated[list, window_messages]
+    rounds: Annotated[int, operator.add]
+    summary: Annotated[list[str], operator.add]
+    prompt_tokens: Annotated[list[int], operator.add]
 
 
 class FinancialAnalysisGraph:
@@ -28,70 +93,181 @@ class FinancialAnalysisGraph:
     """
 
     @classmethod
-    def create_graph(cls, generate_agent, reflect_agent):
+    def create_graph(
+        cls,
+        generate_agent,
+        reflect_agent,
+        tracker: LatencyTracker | None = None,
+        compact: bool = False,
+        summarize: bool = False,
+        checkpoint: bool = True,
+    ):
         """
         Create a state graph for the financial analysis workflow.
 
+        A `Deadline` passed as `deadline` in the configurable section of the run
+        config stops the refinement loop once another round no longer fits in
+        the remaining budget, returning the latest answer.
+
+        In compact mode, the state only keeps the context, the latest answer and
+        the latest critique instead of the full conversation, so prompts do not
+        grow with the number of rounds.
+
         Args:
             generate_agent: Agent responsible for generating analysis.
             reflect_agent: Agent responsible for critiquing analysis.
+            tracker (LatencyTracker, optional): Tracker recording node latencies,
+                used to estimate the cost of another round. Defaults to None.
+            compact (bool, optional): Keep a window of the conversation.
+                Defaults to False.
+            summarize (bool, optional): In compact mode, give the analyst a
+                one-line summary of the answers of earlier rounds.
+                Defaults to False.
+            checkpoint (bool, optional): Keep conversations in a memory
+                checkpoint. Defaults to True.
 
         Returns:
             Compiled graph workflow.
         """
 
-        def generation_node(state: State) -> State:
+        def timed_invoke(name: str, agent, messages: list, config: RunnableConfig):
+            """
+            Invoke an agent and record its latency.
+
+            The run config is passed on explicitly, as it does not reach agents
+            of a streamed graph through the context on Python 3.10.
+
+            Args:
+                name (str): Node name.
+                agent: Agent to invoke.
+                messages (list): Input messages.
+                config (RunnableConfig): Run configuration.
+
+            Returns:
+                Agent response message.
+            """
+            start = time.perf_counter()
+            res = agent.invoke(messages, config)
+            # Hedged agents record the latency of their first request themselves
+            if tracker is not None and not isinstance(agent, HedgedRunnable):
+                tracker.record(name, time.perf_counter() - start)
+            return res
+
+        def prompt_tokens(res) -> list[int]:
+            """
+            Extract the prompt token count of an LLM response.
+
+            Args:
+                res: Agent response message.
+
+            Returns:
+                list[int]: Prompt tokens of the call, 0 when usage is unavailable.
+            """
+            usage = getattr(res, "usage_metadata", None) or {}
+            return [usage.get("input_tokens", 0)]
+
+        def generation_node(state: State, config: RunnableConfig) -> State:
             """
             Node for generating financial analysis.
 
             Args:
                 state (State): Current workflow state.
+                config (RunnableConfig): Run configuration.
 
             Returns:
                 State: Updated workflow state with generated message.
             """
-            return {"messages": [generate_agent.invoke(state["messages"])]}
+            messages = state["messages"]
+            update = {"rounds": 1}
+            if compact and summarize and state.get("summary"):
+                summary = HumanMessage(
+                    content="\n".join(
+                        ["Answers from earlier rounds:", *state["summary"]]
+                    )
+                )
+                messages = [messages[0], summary, *messages[1:]]
+            if compact and summarize and state.get("rounds"):
+                # The previous answer drops out of the window with this round
+                previous = state["messages"][-2]
+                update["summary"] = [summarize_answer(state["rounds"], previous)]
+
+            res = timed_invoke("generate", generate_agent, messages, config)
+            return {**update, "messages": [res], "prompt_tokens": prompt_tokens(res)}
 
-        def reflection_node(state: State) -> State:
+        def reflection_node(state: State, config: RunnableConfig) -> State:
             """
             Node for reflecting on and critiquing the generated analysis.
 
             Args:
                 state (State): Current workflow state.
+                config (RunnableConfig): Run configuration.
 
             Returns:
                 State: Updated workflow state with reflection message.
             """
             # Translate messages for reflection
-            cls_map = {"ai": HumanMessage, "human": AIMessage}
-            translated = [state["messages"][0]] + [
-                cls_map[msg.type](content=msg.content) for msg in state["messages"][1:]
-            ]
-            res = reflect_agent.invoke(translated)
-            return {"messages": [HumanMessage(content=res.content)]}
-
-        def should_continue(state: State):
+            if compact:
+                answer = state["messages"][-1]
+                translated = [
+                    state["messages"][0],
+                    HumanMessage(content=answer.content),
+                ]
+            else:
+                cls_map = {"ai": HumanMessage, "human": AIMessage}
+                translated = [state["messages"][0]] + [
+                    cls_map[msg.type](content=msg.content)
+                    for msg in state["messages"][1:]
+                ]
+            res = timed_invoke("reflect", reflect_agent, translated, config)
+            return {
+                "messages": [HumanMessage(content=res.content)],
+                "prompt_tokens": prompt_tokens(res),
+            }
+
+        def round_estimate() -> float:
+            """
+            Estimate the duration of another reflect and generate round.
+
+            Unlike hedging, the estimate uses whatever samples exist, so the
+            deadline is respected from the first rounds of a run.
+
+            Returns:
+                float: Median latency of both nodes, 0 for nodes without samples.
+            """
+            if tracker is None:
+                return 0.0
+            return sum(
+                tracker.percentile(name, 50, min_samples=1) or 0.0
+                for name in ("reflect", "generate")
+            )
+
+        def should_continue(state: State, config: RunnableConfig):
             """
             Determine whether to continue the workflow.
 
             Args:
                 state (State): Current workflow state.
+                config (RunnableConfig): Run configuration.
 
             Returns:
                 str: Next node or END marker.
             """
-            if len(state["messages"]) > 6:
+            if state["rounds"] >= MAX_ROUNDS:
+                return END
+            deadline = config.get("configurable", {}).get("deadline")
+            if deadline is not None and not deadline.allows(round_estimate()):
                 return END
             return "reflect"
 
         # Create and configure graph
-        builder = StateGraph(State)
-        builder.add_node("generate", generation_node)
-        builder.add_node("reflect", reflection_node)
+        schema = CompactState if compact else State
+        builder = StateGraph(schema)
+        builder.add_node("generate", generation_node, input=schema)
+        builder.add_node("reflect", reflection_node, input=schema)
         builder.add_edge(START, "generate")
         builder.add_conditional_edges("generate", should_continue)
         builder.add_edge("reflect", "generate")
 
         # Compile graph with memory checkpoint
-        memory = MemorySaver()
+        memory = MemorySaver() if checkpoint else None
         return builder.compile(checkpointer=memory)
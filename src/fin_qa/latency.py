@@ -0,0 +1,193 @@
+"""Module for latency budgets and hedged LLM requests."""
+
+import contextvars
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+import numpy as np
+
+HEDGE_QUANTILE = 90
+MIN_SAMPLES = 20
+WINDOW_SIZE = 200
+
+
+class Deadline:
+    """
+    Latency budget for answering a single question.
+
+    Attributes:
+        budget (float): Total time allowed in seconds.
+        start (float): Performance counter value when the budget started.
+        hit (bool): Whether the workflow was cut short by the deadline.
+    """
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.start = time.perf_counter()
+        self.hit = False
+
+    def elapsed(self) -> float:
+        """
+        Time spent since the deadline was created.
+
+        Returns:
+            float: Elapsed time in seconds.
+        """
+        return time.perf_counter() - self.start
+
+    def remaining(self) -> float:
+        """
+        Time left before the deadline expires.
+
+        Returns:
+            float: Remaining time in seconds, negative once expired.
+        """
+        return self.budget - self.elapsed()
+
+    def allows(self, estimate: float) -> bool:
+        """
+        Check whether work expected to take `estimate` seconds fits in the budget.
+
+        Marks the deadline as hit when it does not.
+
+        Args:
+            estimate (float): Expected duration of the work in seconds.
+
+        Returns:
+            bool: True if the work can be started, False otherwise.
+        """
+        if self.remaining() > estimate:
+            return True
+        self.hit = True
+        return False
+
+
+class LatencyTracker:
+    """
+    Rolling window of observed latencies per graph node.
+
+    Attributes:
+        min_samples (int): Samples required before percentiles are reported.
+        samples (dict[str, deque[float]]): Recent latencies keyed by node name.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE, min_samples: int = MIN_SAMPLES):
+        self.min_samples = min_samples
+        self.samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, name: str, latency: float):
+        """
+        Record an observed latency for a node.
+
+        Args:
+            name (str): Node name.
+            latency (float): Observed latency in seconds.
+        """
+        self.samples[name].append(latency)
+
+    def percentile(
+        self, name: str, q: float, min_samples: int | None = None
+    ) -> float | None:
+        """
+        Latency percentile learned for a node.
+
+        Args:
+            name (str): Node name.
+            q (float): Percentile between 0 and 100.
+            min_samples (int, optional): Samples required instead of the
+                minimum of the tracker. Defaults to None.
+
+        Returns:
+            float | None: The percentile, or None if too few samples were seen.
+        """
+        min_samples = self.min_samples if min_samples is None else min_samples
+        samples = self.samples.get(name)
+        if not samples or len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, q))
+
+
+class HedgedRunnable:
+    """
+    Runnable wrapper that sends a duplicate request when the first one is slower
+    than the learned latency percentile of its node, keeping whichever finishes
+    first.
+
+    The latency of the first request is recorded in the tracker once it
+    finishes, even when the duplicate won, so hedging does not lower the
+    percentile it is triggered by.
+
+    Attributes:
+        runnable: Wrapped runnable.
+        name (str): Node name used to look up learned latencies.
+        tracker (LatencyTracker): Source of learned latencies.
+        quantile (float): Percentile after which the duplicate request is sent.
+        hedged (int): Number of duplicate requests sent.
+        hedge_wins (int): Number of times the duplicate request finished first.
+    """
+
+    def __init__(
+        self,
+        runnable,
+        name: str,
+        tracker: LatencyTracker,
+        quantile: float = HEDGE_QUANTILE,
+        max_workers: int = 8,
+    ):
+        self.runnable = runnable
+        self.name = name
+        self.tracker = tracker
+        self.quantile = quantile
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"hedge-{name}"
+        )
+
+    def _submit(self, input, config, **kwargs) -> Future:
+        # Run in a copy of the caller's context so callbacks and tracing follow
+        context = contextvars.copy_context()
+        return self._executor.submit(
+            context.run, self.runnable.invoke, input, config, **kwargs
+        )
+
+    def _record(self, future: Future, start: float):
+        if future.exception() is None:
+            self.tracker.record(self.name, time.perf_counter() - start)
+
+    def invoke(self, input, config=None, **kwargs):
+        """
+        Invoke the wrapped runnable, hedging slow requests.
+
+        Args:
+            input: Input for the wrapped runnable.
+            config (RunnableConfig, optional): Runnable configuration.
+
+        Returns:
+            Output of whichever request finished first without error.
+        """
+        delay = self.tracker.percentile(self.name, self.quantile)
+        start = time.perf_counter()
+        primary = self._submit(input, config, **kwargs)
+        primary.add_done_callback(lambda future: self._record(future, start))
+        if delay is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self.hedged += 1
+        hedge = self._submit(input, config, **kwargs)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    if future is hedge:
+                        self.hedge_wins += 1
+                    return future.result()
+
+        # Both requests failed, surface the error of the original one
+        return primary.result()
@@ -0,0 +1,139 @@
+"""Module with a local stand-in for the Azure OpenAI chat completions API."""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from src.fin_qa.data_loader import load_prompt_template
+
+DEFAULT_ANSWER = {"steps": ["4.5 + 4.1 + 3.4 = 12.0"], "answer": "12.0"}
+REQUESTS = web.AppKey("requests", Counter)
+BATCH_QUESTION_PATTERN = re.compile(r"^Question \d+:", re.MULTILINE)
+
+
+def create_stub_app(
+    delay: float = 0.5,
+    answer: dict | None = None,
+    failure_rate: float = 0.0,
+    failure_status: int = 429,
+) -> web.Application:
+    """
+    Create an application answering Azure OpenAI chat completion requests.
+
+    The critic receives 'ALL_OK' and the financial analyst receives a fixed
+    answer, or an array with the answer repeated for each numbered question
+    of a joint prompt, after a random delay averaging `delay` seconds. The number of
+    requests received by each deployment is counted in `app[REQUESTS]`.
+
+    Args:
+        delay (float, optional): Mean response delay in seconds. Defaults to 0.5.
+        answer (dict, optional): Analyst answer. Defaults to DEFAULT_ANSWER.
+        failure_rate (float, optional): Share of requests failing with
+            `failure_status`, to stand in for a throttled or unhealthy
+            deployment. Defaults to 0.0.
+        failure_status (int, optional): Status of failed requests.
+            Defaults to 429.
+
+    Returns:
+        web.Application: Stand-in application.
+    """
+    critic_messages = [
+        load_prompt_template("critic", batch=batch) for batch in [False, True]
+    ]
+    answer = answer or DEFAULT_ANSWER
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        """
+        Answer a chat completion request.
+        """
+        request.app[REQUESTS][request.match_info["deployment"]] += 1
+        body = await request.json()
+        await asyncio.sleep(random.expovariate(1 / delay) if delay else 0)
+
+        if random.random() < failure_rate:  # noqa: S311
+            return web.json_response(
+                {"error": {"code": str(failure_status), "message": "Stub failure"}},
+                status=failure_status,
+                headers={"Retry-After": "1"} if failure_status == 429 else None,
+            )
+
+        messages = body["messages"]
+        is_critic = messages[0]["content"] in critic_messages
+        # Questions asked together are numbered in the first user message
+        user_proxy_message = next(
+            (m.get("content") or "" for m in messages if m["role"] == "user"), ""
+        )
+        questions = len(BATCH_QUESTION_PATTERN.findall(user_proxy_message))
+        if is_critic:
+            content = "ALL_OK"
+        elif questions:
+            content = json.dumps([answer] * questions)
+        else:
+            content = json.dumps(answer)
+        prompt_tokens = sum(len(m.get("content") or "") // 4 for m in messages)
+        completion_tokens = len(content) // 4
+        return web.json_response(
+            {
+                "id": f"chatcmpl-{random.getrandbits(32)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.match_info["deployment"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": content},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        )
+
+    app = web.Application()
+    app[REQUESTS] = Counter()
+    app.router.add_post(
+        "/openai/deployments/{deployment}/chat/completions", chat_completions
+    )
+    return app
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(
+        description="Run a local stand-in for Azure OpenAI chat completions."
+    )
+    arg_parser.add_argument("--port", type=int, default=8081, help="Port to listen on.")
+    arg_parser.add_argument(
+        "--delay", type=float, default=0.5, help="Mean response delay in seconds."
+    )
+    arg_parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests failing with --failure-status.",
+    )
+    arg_parser.add_argument(
+        "--failure-status",
+        type=int,
+        default=429,
+        help="Status of failed requests, e.g. 429 or 503.",
+    )
+    args = arg_parser.parse_args()
+
+    web.run_app(
+        create_stub_app(
+            args.delay,
+            failure_rate=args.failure_rate,
+            failure_status=args.failure_status,
+        ),
+        port=args.port,
+    )
@@ -0,0 +1,408 @@
+"""Module for balancing LLM calls across Azure OpenAI endpoints and deployments."""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+import openai
+from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables.config import ensure_config
+from langchain_openai import AzureChatOpenAI
+
+from src.fin_qa import setup_logger
+
+logger = setup_logger(__file__)
+
+POOL_STRATEGIES = ["least-outstanding", "round-robin"]
+MAX_FAILURES = 3
+EJECTION_TIME = 30.0
+MAX_EJECTION_TIME = 300.0
+MAX_PINS = 10000
+
+
+def is_endpoint_failure(error: Exception) -> bool:
+    """
+    Check whether an error means the endpoint is throttled or unhealthy.
+
+    Args:
+        error (Exception): Error raised by an LLM call.
+
+    Returns:
+        bool: True for 429 and 5xx responses, timeouts and connection errors.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, openai.APIConnectionError)
+
+
+def retry_after(error: Exception) -> float:
+    """
+    Read the delay requested by a throttled endpoint.
+
+    Args:
+        error (Exception): Error raised by an LLM call.
+
+    Returns:
+        float: Retry-After delay in seconds, 0 if none was given.
+    """
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class PoolEndpoint:
+    """
+    Azure OpenAI deployment in a pool, with its health and load.
+
+    Attributes:
+        endpoint (str): Azure OpenAI endpoint URL.
+        deployment (str): Deployment name.
+        api_key (str): API key of the endpoint.
+        api_version (str | None): API version, defaults to OPENAI_API_VERSION.
+        weight (float): Share of the calls relative to the other endpoints,
+            usually the TPM quota of the deployment.
+        model_version (str): Model version served by the deployment.
+        outstanding (int): Calls in flight.
+        failures (int): Consecutive 429 and 5xx failures.
+        ejected_until (float | None): Clock value until which the endpoint
+            receives no calls, None while healthy.
+        probing (bool): Whether a probe call to the ejected endpoint is in
+            flight.
+        requests (int): Calls sent.
+        errors (int): Calls that failed with a 429 or 5xx.
+        ejections (int): Times the endpoint was ejected.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        deployment: str,
+        api_key: str,
+        api_version: str | None = None,
+        weight: float = 1.0,
+        model_version: str | None = None,
+    ):
+        if weight <= 0:
+            raise ValueError(f"Weight of {endpoint} must be positive.")
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.weight = weight
+        self.model_version = model_version or deployment
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = None
+        self.probing = False
+        self.current = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self._backoff = 0
+        self._clients = {}
+
+    @property
+    def name(self) -> str:
+        """
+        Name of the endpoint in logs and stats.
+
+        Returns:
+            str: Endpoint URL and deployment.
+        """
+        return f"{self.endpoint}/{self.deployment}"
+
+    def client(self, model: str, temperature: float) -> AzureChatOpenAI:
+        """
+        Get the client of the deployment.
+
+        Retries are left to the pool, so a throttled call fails over to
+        another endpoint instead of waiting on this one.
+
+        Args:
+            model (str): Model name.
+            temperature (float): Sampling temperature.
+
+        Returns:
+            AzureChatOpenAI: Client calling the deployment.
+        """
+        if temperature not in self._clients:
+            self._clients[temperature] = AzureChatOpenAI(
+                model=model,
+                temperature=temperature,
+                azure_endpoint=self.endpoint,
+                azure_deployment=self.deployment,
+                api_key=self.api_key,
+                api_version=self.api_version or os.getenv("OPENAI_API_VERSION"),
+                max_retries=0,
+            )
+        return self._clients[temperature]
+
+
+class EndpointPool:
+    """
+    Pool of deployments serving the same model.
+
+    Calls go to the healthy endpoint with the fewest outstanding calls per unit
+    of weight ("least-outstanding"), or in smooth weighted round robin order
+    ("round-robin"). An endpoint failing `max_failures` times in a row with a
+    429 or 5xx is ejected, and once the ejection time is over a single probe
+    call decides whether it rejoins the pool. The ejection time doubles with
+    each consecutive ejection, up to `max_ejection_time`.
+
+    Conversations, identified by the thread id of the run config, are pinned to
+    the model version of the first endpoint they were sent to.
+
+    Attributes:
+        model (str): Model served by the pool.
+        endpoints (list[PoolEndpoint]): Deployments of the pool.
+        strategy (str): Balancing strategy.
+        max_failures (int): Consecutive failures before an endpoint is ejected.
+        ejection_time (float): First ejection time in seconds.
+        max_ejection_time (float): Longest ejection time in seconds.
+        pins (OrderedDict[str, str]): Model version of recent conversations.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        endpoints: list[PoolEndpoint],
+        strategy: str = "least-outstanding",
+        max_failures: int = MAX_FAILURES,
+        ejection_time: float = EJECTION_TIME,
+        max_ejection_time: float = MAX_EJECTION_TIME,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not endpoints:
+            raise ValueError(f"Pool of {model} has no endpoints.")
+        if strategy not in POOL_STRATEGIES:
+            raise ValueError(f"Unknown pool strategy '{strategy}'.")
+        self.model = model
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.ejection_time = ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.pins = OrderedDict()
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def acquire(self, thread_id: str | None = None) -> PoolEndpoint:
+        """
+        Select the endpoint for a call and count it as outstanding.
+
+        If every endpoint of the conversation's model version is ejected, the
+        one whose ejection ends first is probed early rather than switching the
+        conversation to another version.
+
+        Args:
+            thread_id (str, optional): Conversation id. Defaults to None.
+
+        Returns:
+            PoolEndpoint: Selected endpoint, to be passed to `release`.
+        """
+        with self._lock:
+            now = self._clock()
+            version = self.pins.get(thread_id) if thread_id is not None else None
+            candidates = [
+                endpoint
+                for endpoint in self.endpoints
+                if version is None or endpoint.model_version == version
+            ] or self.endpoints
+
+            healthy = [e for e in candidates if e.ejected_until is None]
+            probes = [
+                e
+                for e in candidates
+                if e.ejected_until is not None
+                and e.ejected_until <= now
+                and not e.probing
+            ]
+            if probes:
+                endpoint = min(probes, key=lambda e: e.ejected_until)
+                endpoint.probing = True
+            elif healthy:
+                endpoint = self._balance(healthy)
+            else:
+                endpoint = min(candidates, key=lambda e: e.ejected_until)
+                endpoint.probing = True
+
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            if thread_id is not None:
+                self.pins[thread_id] = endpoint.model_version
+                self.pins.move_to_end(thread_id)
+                if len(self.pins) > MAX_PINS:
+                    self.pins.popitem(last=False)
+            return endpoint
+
+    def _balance(self, endpoints: list[PoolEndpoint]) -> PoolEndpoint:
+        if self.strategy == "least-outstanding":
+            # Ties go in round robin order, so idle endpoints share the calls
+            load = min((e.outstanding + 1) / e.weight for e in endpoints)
+            endpoints = [e for e in endpoints if (e.outstanding + 1) / e.weight == load]
+
+        # Smooth weighted round robin spreads heavier endpoints across the cycle
+        total = sum(e.weight for e in endpoints)
+        for endpoint in endpoints:
+            endpoint.current += endpoint.weight
+        endpoint = max(endpoints, key=lambda e: e.current)
+        endpoint.current -= total
+        return endpoint
+
+    def release(self, endpoint: PoolEndpoint, error: Exception | None = None):
+        """
+        Record the outcome of a call, ejecting or restoring the endpoint.
+
+        Args:
+            endpoint (PoolEndpoint): Endpoint returned by `acquire`.
+            error (Exception, optional): Error raised by the call.
+                Defaults to None.
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if error is None or not is_endpoint_failure(error):
+                endpoint.failures = 0
+                if endpoint.ejected_until is not None:
+                    logger.info(f"Endpoint {endpoint.name} is back in the pool")
+                endpoint.ejected_until = None
+                endpoint.probing = False
+                endpoint._backoff = 0
+                return
+
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if endpoint.probing or endpoint.failures >= self.max_failures:
+                duration = max(
+                    min(
+                        self.ejection_time * 2**endpoint._backoff,
+                        self.max_ejection_time,
+                    ),
+                    retry_after(error),
+                )
+                endpoint.ejected_until = self._clock() + duration
+                endpoint.probing = False
+                endpoint.failures = 0
+                endpoint.ejections += 1
+                endpoint._backoff += 1
+                logger.warning(
+                    f"Ejected endpoint {endpoint.name} for {duration:.0f}s: {error}"
+                )
+
+    def stats(self) -> list[dict[str, Any]]:
+        """
+        Summarize the load and health of each endpoint.
+
+        Returns:
+            list[dict[str, Any]]: Calls, errors and ejections of each endpoint.
+        """
+        with self._lock:
+            return [
+                {
+                    "model": self.model,
+                    "endpoint": endpoint.name,
+                    "model_version": endpoint.model_version,
+                    "weight": endpoint.weight,
+                    "requests": endpoint.requests,
+                    "errors": endpoint.errors,
+                    "ejections": endpoint.ejections,
+                    "ejected": endpoint.ejected_until is not None,
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+class PooledChatModel(Runnable):
+    """
+    Chat model sending each call to an endpoint of a pool.
+
+    A call failing with a 429 or 5xx is reported to the pool and raised, so
+    that the retry of the agent goes to another endpoint.
+
+    Attributes:
+        pool (EndpointPool): Pool of deployments serving the model.
+        temperature (float): Sampling temperature.
+    """
+
+    def __init__(self, pool: EndpointPool, temperature: float = 0.0):
+        self.pool = pool
+        self.temperature = temperature
+
+    def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs):
+        """
+        Invoke the chat model on an endpoint of the pool.
+
+        Args:
+            input (Any): Prompt value or messages.
+            config (RunnableConfig, optional): Run configuration, whose thread
+                id pins the conversation to a model version.
+
+        Returns:
+            AIMessage: Response of the endpoint.
+        """
+        config = ensure_config(config)
+        thread_id = config.get("configurable", {}).get("thread_id")
+        endpoint = self.pool.acquire(thread_id)
+        try:
+            res = endpoint.client(self.pool.model, self.temperature).invoke(
+                input, config, **kwargs
+            )
+        except Exception as e:
+            self.pool.release(endpoint, e)
+            raise
+        self.pool.release(endpoint)
+        return res
+
+
+def load_pools(
+    path: str, strategy: str = "least-outstanding"
+) -> dict[str, EndpointPool]:
+    """
+    Load endpoint pools from a JSON file.
+
+    The file maps each model to its deployments, e.g.
+    {"gpt-4o": [{"endpoint": "https://east.openai.azure.com",
+    "deployment": "gpt-4o", "api_key_env": "AZURE_OPENAI_API_KEY_EAST",
+    "weight": 450, "model_version": "2024-08-06"}]}. Keys are read from the
+    environment variable named by "api_key_env", or given as "api_key".
+
+    Args:
+        path (str): Path to the pool file.
+        strategy (str, optional): Balancing strategy. Defaults to
+            "least-outstanding".
+
+    Returns:
+        dict[str, EndpointPool]: Pool of each model.
+
+    Raises:
+        ValueError: If an entry has no API key.
+    """
+    with open(path) as f:
+        config = json.load(f)
+
+    pools = {}
+    for model, entries in config.items():
+        endpoints = []
+        for entry in entries:
+            api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", ""))
+            if not api_key:
+                raise ValueError(
+                    f"No API key for {entry['endpoint']}/{entry['deployment']}."
+                )
+            endpoints.append(
+                PoolEndpoint(
+                    entry["endpoint"],
+                    entry["deployment"],
+                    api_key,
+                    api_version=entry.get("api_version"),
+                    weight=float(entry.get("weight", 1.0)),
+                    model_version=entry.get("model_version"),
+                )
+            )
+        pools[model] = EndpointPool(model, endpoints, strategy)
+    return pools
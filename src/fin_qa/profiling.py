@@ -0,0 +1,270 @@
+"""Module for profiling local CPU time against LLM wait time."""
+
+import html
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+
+PROFILE_INTERVAL = 0.005
+LOCAL = "local"
+LLM_WAIT = "llm_wait"
+
+# Packages performing the HTTP calls to the LLM
+LLM_HTTP_PACKAGES = ["httpx", "httpcore"]
+
+# Frames where a thread backs off before retrying a throttled LLM call, as
+# (package, file, function)
+LLM_RETRY_FRAMES = {
+    ("tenacity", "nap.py", "sleep"),
+    ("openai", "_base_client.py", "_sleep_for_retry"),
+}
+
+# Frames where a thread waits for work rather than running code
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("selectors.py", "select"),
+}
+
+
+def frame_label(filename: str, function: str, lineno: int) -> str:
+    """
+    Label a frame with its function and a short file location.
+
+    Args:
+        filename (str): Source file of the frame.
+        function (str): Function name.
+        lineno (int): First line of the function.
+
+    Returns:
+        str: Label such as "invoke (graph.py:42)".
+    """
+    return f"{function} ({Path(filename).name}:{lineno})"
+
+
+def classify_stack(frames: list[tuple[str, str]]) -> str | None:
+    """
+    Classify a sampled stack as local work, LLM wait or idle.
+
+    Backoff sleeps between retries of LLM calls count as LLM wait.
+
+    Args:
+        frames (list[tuple[str, str]]): Filename and function of each frame,
+            from the outermost to the innermost.
+
+    Returns:
+        str | None: LOCAL, LLM_WAIT, or None for idle threads.
+    """
+    if not frames:
+        return None
+    filename, function = frames[-1]
+    path = Path(filename)
+    if (path.name, function) in IDLE_FRAMES:
+        return None
+    if (path.parent.name, path.name, function) in LLM_RETRY_FRAMES:
+        return LLM_WAIT
+    for filename, _ in frames:
+        parts = Path(filename).parts
+        if any(package in parts for package in LLM_HTTP_PACKAGES):
+            return LLM_WAIT
+    return LOCAL
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler over every thread of the process.
+
+    Samples are tagged as local work or as waiting inside LLM HTTP calls,
+    while idle threads are ignored. Every sampled thread counts the time since
+    the previous sample, so the time of each category is in thread-seconds and
+    exceeds the wall time when several threads are busy at once.
+
+    Attributes:
+        interval (float): Time between samples in seconds.
+        stacks (Counter): Sample count of each (category, *frames) stack.
+        seconds (Counter): Estimated thread-seconds spent in each category.
+        wall_seconds (float): Wall time sampled in seconds.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.seconds = Counter()
+        self.wall_seconds = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """
+        Start sampling in a background thread.
+        """
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop sampling.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            self.wall_seconds += elapsed
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self._sample(frame, elapsed)
+
+    def _sample(self, frame, elapsed: float):
+        frames = []
+        labels = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append((code.co_filename, code.co_name))
+            labels.append(
+                frame_label(code.co_filename, code.co_name, code.co_firstlineno)
+            )
+            frame = frame.f_back
+        frames.reverse()
+        labels.reverse()
+
+        category = classify_stack(frames)
+        if category is not None:
+            self.stacks[(category, *labels)] += 1
+            self.seconds[category] += elapsed
+
+    def folded(self) -> str:
+        """
+        Export the samples in the folded stack format used by flamegraph tools.
+
+        Returns:
+            str: One "frame;frame;frame count" line per distinct stack.
+        """
+        return "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items())
+        )
+
+    def hotspots(self, top: int = 25) -> list[dict]:
+        """
+        Rank the functions where local time is spent.
+
+        Args:
+            top (int, optional): Number of functions to return. Defaults to 25.
+
+        Returns:
+            list[dict]: Function, self and total samples and their estimated
+                thread-seconds, sorted by self samples.
+        """
+        own = Counter()
+        total = Counter()
+        for (category, *labels), count in self.stacks.items():
+            if category != LOCAL:
+                continue
+            own[labels[-1]] += count
+            for label in set(labels):
+                total[label] += count
+
+        samples = sum(own.values())
+        seconds_per_sample = self.seconds[LOCAL] / samples if samples else 0.0
+        return [
+            {
+                "function": label,
+                "self_samples": count,
+                "total_samples": total[label],
+                "self_seconds": round(count * seconds_per_sample, 4),
+                "total_seconds": round(total[label] * seconds_per_sample, 4),
+            }
+            for label, count in own.most_common(top)
+        ]
+
+
+def render_flamegraph(
+    stacks: Counter, width: int = 1200, frame_height: int = 16
+) -> str:
+    """
+    Render sampled stacks as an SVG flame graph.
+
+    The outermost frames are drawn at the top, LLM wait in blue and local work
+    in warm colors.
+
+    Args:
+        stacks (Counter): Sample count of each stack.
+        width (int, optional): Width of the image in pixels. Defaults to 1200.
+        frame_height (int, optional): Height of a frame in pixels. Defaults to 16.
+
+    Returns:
+        str: SVG document.
+    """
+    # Build a tree of frames with the sample count of each node
+    root = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        root["count"] += count
+        node = root
+        for label in stack:
+            node = node["children"].setdefault(label, {"count": 0, "children": {}})
+            node["count"] += count
+
+    total = root["count"] or 1
+    rects = []
+    depth_max = 0
+
+    def draw(node: dict, label: str, x: float, depth: int, category: str):
+        nonlocal depth_max
+        depth_max = max(depth_max, depth)
+        frame_width = node["count"] / total * width
+        if category == LLM_WAIT:
+            color = "rgb(90,150,230)"
+        else:
+            hue = zlib.crc32(label.encode()) % 60
+            color = f"rgb(230,{100 + hue},60)"
+        name = html.escape(label)
+        percent = node["count"] / total * 100
+        text = ""
+        if frame_width > 30:
+            chars = int(frame_width / 7)
+            short = label if len(label) <= chars else label[: chars - 2] + ".."
+            text = (
+                f'<text x="{x + 3:.1f}" y="{depth * frame_height + 12}" '
+                f'font-size="11" font-family="monospace">{html.escape(short)}</text>'
+            )
+        rects.append(
+            f"<g><title>{name} ({node['count']} samples, {percent:.2f}%)</title>"
+            f'<rect x="{x:.1f}" y="{depth * frame_height}" width="{frame_width:.1f}" '
+            f'height="{frame_height - 1}" fill="{color}" />{text}</g>'
+        )
+        child_x = x
+        for child_label, child in sorted(node["children"].items()):
+            draw(child, child_label, child_x, depth + 1, category)
+            child_x += child["count"] / total * width
+
+    x = 0.0
+    for label, node in sorted(root["children"].items()):
+        draw(node, label, x, 0, label)
+        x += node["count"] / total * width
+
+    height = (depth_max + 1) * frame_height
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">' + "".join(rects) + "</svg>"
+    )
@@ -0,0 +1,135 @@
+"""Module for sampling financial data records for evaluation runs."""
+
+import random
+import re
+from collections import defaultdict
+from typing import Any
+
+SAMPLE_STRATEGIES = ["head", "random", "ticker-year", "question-count"]
+
+# Tickers may contain slashes, e.g. "Double_BRK/B/2010/page_2.pdf"
+RECORD_ID_PATTERN = re.compile(
+    r"^(?P<kind>[^_/]+)_(?P<ticker>.+?)/(?P<year>\d{4})/page_"
+)
+
+
+def parse_record_id(record_id: str) -> tuple[str, str, str]:
+    """
+    Parse the record kind, company ticker and year from a record id.
+
+    Args:
+        record_id (str): Record id, e.g. "Single_JKHY/2009/page_28.pdf-3" or
+            "Double_BRK/B/2010/page_2.pdf".
+
+    Returns:
+        tuple[str, str, str]: Kind, ticker and year, e.g. ("Single", "JKHY",
+            "2009"). Empty strings if the id does not follow the pattern.
+    """
+    match = RECORD_ID_PATTERN.match(record_id)
+    if not match:
+        return "", "", ""
+    return match.group("kind"), match.group("ticker"), match.group("year")
+
+
+def record_stratum(record: dict[str, Any], strategy: str) -> tuple:
+    """
+    Get the stratum of a record for a stratified sampling strategy.
+
+    Args:
+        record (dict[str, Any]): Financial data record.
+        strategy (str): Either "ticker-year" or "question-count".
+
+    Returns:
+        tuple: Key identifying the stratum of the record.
+    """
+    if strategy == "ticker-year":
+        _, ticker, year = parse_record_id(record["id"])
+        return ticker, year
+    questions = sum(1 for key in ["qa_0", "qa_1", "qa"] if record.get(key))
+    return ("multi" if questions > 1 else "single",)
+
+
+def allocate(sizes: dict[tuple, int], n: int, rng: random.Random) -> dict[tuple, int]:
+    """
+    Allocate a sample size across strata proportionally to their sizes.
+
+    Uses the largest remainder method, breaking ties at random.
+
+    Args:
+        sizes (dict[tuple, int]): Number of records in each stratum.
+        n (int): Total sample size.
+        rng (random.Random): Random number generator.
+
+    Returns:
+        dict[tuple, int]: Number of records to sample from each stratum.
+    """
+    total = sum(sizes.values())
+    quotas = {key: n * size / total for key, size in sizes.items()}
+    allocation = {key: int(quota) for key, quota in quotas.items()}
+
+    keys = list(sizes)
+    rng.shuffle(keys)
+    keys.sort(key=lambda key: quotas[key] - allocation[key], reverse=True)
+    for key in keys[: n - sum(allocation.values())]:
+        allocation[key] += 1
+    return allocation
+
+
+def sample_records(
+    records: list[dict[str, Any]],
+    n: int,
+    strategy: str = "head",
+    seed: int | None = None,
+) -> list[dict[str, Any]]:
+    """
+    Sample records for an evaluation run.
+
+    Random samples are returned in random order, and stratified samples
+    interleave their strata in proportion to their allocation, so that any
+    prefix of the sample is itself a random or stratified sample.
+
+    Args:
+        records (list[dict[str, Any]]): Financial data records.
+        n (int): Number of records to sample.
+        strategy (str, optional): One of "head" (first n records), "random",
+            "ticker-year" (stratified by company ticker and year) or
+            "question-count" (stratified by single and multi question records).
+            Defaults to "head".
+        seed (int, optional): Random seed. Defaults to None.
+
+    Returns:
+        list[dict[str, Any]]: Sampled records.
+
+    Raises:
+        ValueError: If the strategy is unknown.
+    """
+    if strategy not in SAMPLE_STRATEGIES:
+        raise ValueError(f"Unknown sample strategy '{strategy}'.")
+
+    if strategy == "head":
+        return records[:n]
+
+    rng = random.Random(seed)  # noqa: S311
+    n = min(n, len(records))
+
+    if strategy == "random":
+        return rng.sample(records, n)
+
+    strata = defaultdict(list)
+    for record in records:
+        strata[record_stratum(record, strategy)].append(record)
+
+    allocation = allocate({key: len(group) for key, group in strata.items()}, n, rng)
+
+    # Weighted round robin over strata, the i-th of k records of a stratum being
+    # placed at (i + offset) / k of the sample
+    positions = []
+    for key, group in strata.items():
+        chosen = rng.sample(group, allocation[key])
+        offset = rng.random()
+        positions += [
+            ((i + offset) / len(chosen), rng.random(), record)
+            for i, record in enumerate(chosen)
+        ]
+    positions.sort(key=lambda position: position[:2])
+    return [record for _, _, record in positions]
@@ -0,0 +1,376 @@
+"""Module for serving financial question answering over HTTP."""
+
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any
+
+from aiohttp import web
+from langchain.prompts import PromptTemplate
+from langchain_core.messages import HumanMessage
+
+from src.fin_qa import setup_logger
+from src.fin_qa.data_conversion import (
+    convert_to_markdown_table,
+    convert_to_paragraph,
+    fix_invalid_json,
+)
+from src.fin_qa.data_loader import load_prompt_template
+from src.fin_qa.latency import Deadline, LatencyTracker
+
+logger = setup_logger(__file__)
+
+PAYLOAD_FIELDS = ["pre_text", "post_text", "table", "question"]
+QUANTILES = [50, 95, 99]
+
+
+class OverloadedError(Exception):
+    """Raised when a request is rejected by admission control."""
+
+
+class ServiceMetrics:
+    """
+    Counters, gauges and latency windows of the service.
+
+    Attributes:
+        requests (int): Requests admitted.
+        rejected (int): Requests rejected by admission control.
+        coalesced (int): Requests served by the graph run of another request.
+        runs (int): Graph runs started.
+        errors (int): Graph runs that failed.
+        in_flight (int): Graph runs executing.
+        queue_depth (int): Graph runs waiting for a free slot.
+        latencies (LatencyTracker): Request latency and queue wait windows.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.rejected = 0
+        self.coalesced = 0
+        self.runs = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.latencies = LatencyTracker(min_samples=1)
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text format.
+
+        Returns:
+            str: Metrics exposition.
+        """
+        lines = []
+        for name in ["requests", "rejected", "coalesced", "runs", "errors"]:
+            lines.append(f"# TYPE fin_qa_{name}_total counter")
+            lines.append(f"fin_qa_{name}_total {getattr(self, name)}")
+        for name in ["in_flight", "queue_depth"]:
+            lines.append(f"# TYPE fin_qa_{name} gauge")
+            lines.append(f"fin_qa_{name} {getattr(self, name)}")
+        for name in ["latency", "queue_wait"]:
+            lines.append(f"# TYPE fin_qa_{name}_seconds summary")
+            for q in QUANTILES:
+                value = self.latencies.percentile(name, q)
+                value = "NaN" if value is None else round(value, 4)
+                lines.append(f'fin_qa_{name}_seconds{{quantile="{q / 100}"}} {value}')
+            count = len(self.latencies.samples.get(name, []))
+            lines.append(f"fin_qa_{name}_seconds_count {count}")
+        return "\n".join(lines) + "\n"
+
+
+class QuestionRun:
+    """
+    Graph run shared by every request asking the same question about the same
+    document.
+
+    Attributes:
+        subscribers (list[asyncio.Queue]): Event queues of the requests.
+        created (float): Performance counter value when the run was queued.
+    """
+
+    def __init__(self):
+        self.subscribers = []
+        self.created = time.perf_counter()
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Subscribe a request to the events of the run.
+
+        Returns:
+            asyncio.Queue: Queue receiving the events, then None once done.
+        """
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        return queue
+
+    def publish(self, event: dict[str, Any] | None):
+        """
+        Send an event to every subscribed request.
+
+        Args:
+            event (dict[str, Any] | None): Event, or None to end the stream.
+        """
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+def validate_payload(payload: Any) -> dict[str, Any]:
+    """
+    Validate a question payload.
+
+    Args:
+        payload (Any): Decoded request body.
+
+    Returns:
+        dict[str, Any]: The payload.
+
+    Raises:
+        ValueError: If a field is missing or has the wrong type.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("Payload must be a JSON object.")
+    missing = [field for field in PAYLOAD_FIELDS if field not in payload]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}.")
+    if not isinstance(payload["question"], str):
+        raise ValueError("'question' must be a string.")
+    for field in ["pre_text", "post_text"]:
+        if not isinstance(payload[field], str | list):
+            raise ValueError(f"'{field}' must be a string or a list of strings.")
+    if not isinstance(payload["table"], list) or not all(
+        isinstance(row, list) for row in payload["table"]
+    ):
+        raise ValueError("'table' must be a list of rows.")
+    return payload
+
+
+def context_key(payload: dict[str, Any]) -> str:
+    """
+    Hash the document context of a payload.
+
+    Args:
+        payload (dict[str, Any]): Question payload.
+
+    Returns:
+        str: Key shared by payloads with the same document context.
+    """
+    context = [payload["pre_text"], payload["post_text"], payload["table"]]
+    return hashlib.sha256(json.dumps(context).encode()).hexdigest()
+
+
+def render_context(payload: dict[str, Any]) -> dict[str, str]:
+    """
+    Render the document context of a payload for the user proxy prompt.
+
+    Args:
+        payload (dict[str, Any]): Question payload.
+
+    Returns:
+        dict[str, str]: Rendered pre text, post text and table.
+    """
+    context = {}
+    for field in ["pre_text", "post_text"]:
+        text = payload[field]
+        context[field] = text if isinstance(text, str) else convert_to_paragraph(text)
+    context["table"] = (
+        convert_to_markdown_table(payload["table"]) if payload["table"] else ""
+    )
+    return context
+
+
+class QAService:
+    """
+    Question answering service reusing one compiled graph across requests.
+
+    Requests arriving within the batch window for the same document are
+    rendered once, and identical questions share a single graph run. Different
+    questions on the same document still run their own graph, so no LLM call
+    is shared between them.
+
+    Attributes:
+        graph: Compiled financial analysis graph.
+        parser: Parser for the final analyst answer.
+        max_queue (int): Graph runs allowed to wait for a free slot.
+        batch_window (float): Time in seconds to wait for requests to coalesce.
+        deadline (float | None): Latency budget per question in seconds.
+        metrics (ServiceMetrics): Service metrics.
+    """
+
+    def __init__(
+        self,
+        graph,
+        parser,
+        max_concurrency: int = 4,
+        max_queue: int = 32,
+        batch_window: float = 0.01,
+        deadline: float | None = None,
+    ):
+        self.graph = graph
+        self.parser = parser
+        self.max_queue = max_queue
+        self.batch_window = batch_window
+        self.deadline = deadline
+        self.metrics = ServiceMetrics()
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._batches = {}
+        self._tasks = set()
+
+    def submit(self, payload: Any) -> AsyncIterator[dict[str, Any]]:
+        """
+        Admit a question and subscribe to the events of its graph run.
+
+        Args:
+            payload (Any): Question payload with pre_text, post_text, table and
+                question.
+
+        Returns:
+            AsyncIterator[dict[str, Any]]: Answer, critique and result events.
+
+        Raises:
+            ValueError: If the payload is invalid.
+            OverloadedError: If too many graph runs are waiting for a slot.
+        """
+        payload = validate_payload(payload)
+        key = context_key(payload)
+        batch = self._batches.get(key, {})
+
+        # Only questions needing a new graph run count against the queue
+        run = batch.get(payload["question"])
+        if run is None and self.metrics.queue_depth >= self.max_queue:
+            self.metrics.rejected += 1
+            raise OverloadedError("Too many questions waiting, retry later.")
+        self.metrics.requests += 1
+
+        if key not in self._batches:
+            self._batches[key] = batch
+            asyncio.get_running_loop().call_later(
+                self.batch_window, self._flush, key, payload
+            )
+
+        if run is None:
+            run = batch[payload["question"]] = QuestionRun()
+            self.metrics.queue_depth += 1
+        else:
+            self.metrics.coalesced += 1
+
+        return self._events(run.subscribe(), time.perf_counter())
+
+    async def _events(self, queue: asyncio.Queue, arrived: float):
+        while (event := await queue.get()) is not None:
+            yield event
+        self.metrics.latencies.record("latency", time.perf_counter() - arrived)
+
+    def _flush(self, key: str, payload: dict[str, Any]):
+        batch = self._batches.pop(key)
+        context = render_context(payload)
+        for question, run in batch.items():
+            task = asyncio.create_task(self._execute(context, question, run))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, context: dict[str, str], question: str, run: QuestionRun):
+        user_proxy_message = load_prompt_template(
+            "user_proxy", question=question, **context
+        )
+
+        async with self._slots:
+            self.metrics.queue_depth -= 1
+            self.metrics.latencies.record(
+                "queue_wait", time.perf_counter() - run.created
+            )
+            self.metrics.in_flight += 1
+            self.metrics.runs += 1
+            try:
+                await self._stream(user_proxy_message, run)
+            except Exception as e:
+                self.metrics.errors += 1
+                logger.error(
+                    f"An unexpected error occurred for question {question}: {e}"
+                )
+                run.publish({"event": "error", "message": str(e)})
+            finally:
+                self.metrics.in_flight -= 1
+                run.publish(None)
+
+    async def _stream(self, user_proxy_message: str, run: QuestionRun):
+        # Each run is its own conversation, pinned to one model version
+        config = {
+            "configurable": {
+                "thread_id": str(uuid.uuid4()),
+                "deadline": Deadline(self.deadline) if self.deadline else None,
+            }
+        }
+
+        content = None
+        rounds = 0
+        async for update in self.graph.astream(
+            {"messages": [HumanMessage(content=user_proxy_message)]},
+            config,
+            stream_mode="updates",
+        ):
+            for node, values in update.items():
+                message = values["messages"][-1]
+                if node == "generate":
+                    rounds += 1
+                    content = message.content
+                    run.publish(
+                        {"event": "answer", "round": rounds, "content": content}
+                    )
+                else:
+                    run.publish({"event": "critique", "content": message.content})
+
+        prompt_value = PromptTemplate(template=user_proxy_message).format_prompt()
+        parsed_content = await asyncio.to_thread(
+            self.parser.parse_with_prompt, fix_invalid_json(content), prompt_value
+        )
+        run.publish(
+            {
+                "event": "result",
+                "steps": parsed_content.get("steps", []),
+                "answer": parsed_content.get("answer"),
+            }
+        )
+
+
+def create_app(service: QAService) -> web.Application:
+    """
+    Create the HTTP application of the service.
+
+    Args:
+        service (QAService): Question answering service.
+
+    Returns:
+        web.Application: Application with the /qa and /metrics routes.
+    """
+
+    async def answer(request: web.Request) -> web.StreamResponse:
+        """
+        Answer a question, streaming events as newline-delimited JSON.
+        """
+        try:
+            events = service.submit(await request.json())
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=400)
+        except OverloadedError as e:
+            return web.json_response({"error": str(e)}, status=429)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for event in events:
+            await response.write((json.dumps(event) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def metrics(request: web.Request) -> web.Response:
+        """
+        Expose service metrics in the Prometheus text format.
+        """
+        return web.Response(text=service.metrics.render())
+
+    app = web.Application()
+    app.router.add_post("/qa", answer)
+    app.router.add_get("/metrics", metrics)
+    return app
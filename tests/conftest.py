@@ -0,0 +1,35 @@
+import asyncio
+import threading
+
+import pytest
+from aiohttp import web
+
+from fin_qa.llm_stub import create_stub_app
+
+
+@pytest.fixture
+def stub_servers():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runners = []
+
+    def start(**kwargs):
+        app = create_stub_app(delay=0, **kwargs)
+
+        async def serve():
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            runners.append(runner)
+            return runner.addresses[0][1]
+
+        port = asyncio.run_coroutine_threadsafe(serve(), loop).result()
+        return app, f"http://127.0.0.1:{port}"
+
+    yield start
+
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
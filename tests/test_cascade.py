@@ -0,0 +1,271 @@
+import pytest
+from langchain.output_parsers import RetryOutputParser
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.runnables import RunnableLambda
+
+from fin_qa.cascade import CascadeTier, ModelCascade
+from fin_qa.graph import FinancialAnalysisGraph
+from fin_qa.latency import Deadline
+
+
+def make_tier(name, answers, critiques=("ALL_OK",)):
+    calls = {"generate": 0, "reflect": 0}
+
+    def generate(messages):
+        answer = answers[calls["generate"] % len(answers)]
+        calls["generate"] += 1
+        return AIMessage(content=answer)
+
+    def reflect(messages):
+        critique = critiques[calls["reflect"] % len(critiques)]
+        calls["reflect"] += 1
+        return AIMessage(content=critique)
+
+    generate = RunnableLambda(generate)
+    reflect = RunnableLambda(reflect)
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect)
+    return CascadeTier(name, graph, JsonOutputParser(), generate, reflect), calls
+
+
+def test_cascade_accepts_confident_cheap_answer():
+    """Test that a confident answer of the cheap tier is not escalated."""
+    cheap, cheap_calls = make_tier("cheap", ['{"steps": [], "answer": "1"}'])
+    strong, strong_calls = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+
+    result = ModelCascade([cheap, strong]).answer("question", "0")
+
+    assert result["tier"] == "cheap"
+    assert result["answers"] == [{"steps": [], "answer": "1"}]
+    assert not result["escalated"]
+    # The final answer is reviewed once more after the graph run
+    assert result["llm_calls"] == {"cheap": 8}
+    assert strong_calls == {"generate": 0, "reflect": 0}
+
+
+def test_cascade_escalates_on_critique():
+    """Test that an answer the critic did not approve is escalated."""
+    cheap, _ = make_tier("cheap", ['{"steps": [], "answer": "1"}'], ["Wrong total"])
+    strong, _ = make_tier("strong", ['{"steps": [], "answer": "2"}'], ["Wrong total"])
+
+    result = ModelCascade([cheap, strong]).answer("question", "0")
+
+    # The last tier is accepted whatever its critique
+    assert result["tier"] == "strong"
+    assert result["answers"] == [{"steps": [], "answer": "2"}]
+    assert result["escalated"]
+    assert result["failed_signals"] == ["cheap:critic"]
+    assert result["llm_calls"] == {"cheap": 8, "strong": 7}
+
+
+def test_cascade_reviews_final_answer():
+    """Test that the critic signal reviews the final answer, not an earlier one."""
+    # The graph critiques three answers, the fourth one is reviewed last
+    cheap, cheap_calls = make_tier(
+        "cheap",
+        ['{"steps": [], "answer": "1"}'],
+        ["Wrong total", "Wrong total", "ALL_OK", "Wrong total"],
+    )
+    strong, _ = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+
+    result = ModelCascade([cheap, strong], ["critic"]).answer("question", "0")
+
+    assert cheap_calls["reflect"] == 4
+    assert result["tier"] == "strong"
+    assert result["failed_signals"] == ["cheap:critic"]
+
+
+def test_cascade_escalates_on_parse_failure():
+    """Test that an answer that is not valid JSON is escalated."""
+    cheap, _ = make_tier("cheap", ["The answer is 1"])
+    strong, _ = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+
+    result = ModelCascade([cheap, strong], ["parse"]).answer("question", "0")
+
+    assert result["tier"] == "strong"
+    assert result["failed_signals"] == ["cheap:parse"]
+
+
+def test_cascade_escalates_on_disagreement():
+    """Test that two cheap samples giving different numbers are escalated."""
+    cheap, cheap_calls = make_tier(
+        "cheap",
+        [
+            '{"steps": [], "answer": "1"}',
+            '{"steps": [], "answer": "1"}',
+            '{"steps": [], "answer": "1"}',
+            '{"steps": [], "answer": "1"}',
+            '{"steps": [], "answer": "5"}',
+        ],
+    )
+    strong, _ = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+
+    result = ModelCascade([cheap, strong], ["agreement"]).answer("question", "0")
+
+    assert cheap_calls["generate"] == 5
+    assert result["tier"] == "strong"
+    assert result["failed_signals"] == ["cheap:agreement"]
+    assert result["llm_calls"]["cheap"] == 8
+
+
+def test_cascade_does_not_escalate_after_deadline():
+    """Test that the cheap answer is kept once the deadline is spent."""
+    cheap, _ = make_tier("cheap", ['{"steps": [], "answer": "1"}'], ["Wrong total"])
+    strong, strong_calls = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+    deadline = Deadline(0.0)
+
+    result = ModelCascade([cheap, strong]).answer("question", "0", deadline)
+
+    assert result["tier"] == "cheap"
+    assert not result["escalated"]
+    assert deadline.hit
+    assert strong_calls["generate"] == 0
+
+
+def test_cascade_rejects_unknown_signal():
+    """Test that unknown confidence signals are rejected."""
+    cheap, _ = make_tier("cheap", ['{"steps": [], "answer": "1"}'])
+
+    with pytest.raises(ValueError):
+        ModelCascade([cheap], ["votes"])
+
+
+def test_cascade_answers_questions_together():
+    """Test that a joint answer is split into the answers of each question."""
+    cheap, _ = make_tier(
+        "cheap", ['[{"steps": [], "answer": "1"}, {"steps": [], "answer": "2"}]']
+    )
+
+    result = ModelCascade([cheap]).answer("questions", "0", questions=2)
+
+    assert [answer["answer"] for answer in result["answers"]] == ["1", "2"]
+
+
+def test_cascade_escalates_on_missing_joint_answer():
+    """Test that a joint answer without an item per question is escalated."""
+    cheap, _ = make_tier("cheap", ['[{"steps": [], "answer": "1"}]'])
+    strong, _ = make_tier(
+        "strong", ['[{"steps": [], "answer": "1"}, {"steps": [], "answer": "2"}]']
+    )
+
+    result = ModelCascade([cheap, strong], ["parse"]).answer(
+        "questions", "0", questions=2
+    )
+
+    assert result["tier"] == "strong"
+    assert len(result["answers"]) == 2
+
+
+def test_cascade_reports_unanswered_questions():
+    """Test that a failed graph run is reported instead of dropped."""
+
+    def fail(messages):
+        raise RuntimeError("Service unavailable")
+
+    agent = RunnableLambda(fail)
+    graph = FinancialAnalysisGraph.create_graph(agent, agent)
+    tier = CascadeTier("cheap", graph, JsonOutputParser(), agent, agent)
+
+    result = ModelCascade([tier]).answer("questions", "0", questions=2)
+
+    assert result["answers"] is None
+    assert result["error"] == "graph"
+    assert result["tier"] == "cheap"
+
+
+def test_cascade_counts_parser_retry_calls():
+    """Test that the LLM call fixing an invalid answer is counted."""
+    cheap, _ = make_tier("cheap", ["The answer is 1"])
+    fixer = GenericFakeChatModel(
+        messages=iter(
+            [
+                AIMessage(
+                    content='{"steps": [], "answer": "1"}',
+                    usage_metadata={
+                        "input_tokens": 11,
+                        "output_tokens": 5,
+                        "total_tokens": 16,
+                    },
+                )
+            ]
+        )
+    )
+    cheap.parser = RetryOutputParser.from_llm(parser=JsonOutputParser(), llm=fixer)
+
+    result = ModelCascade([cheap]).answer("question", "0")
+
+    assert result["answers"] == [{"steps": [], "answer": "1"}]
+    assert result["error"] is None
+    assert result["llm_calls"] == {"cheap": 8}
+    assert result["tier_prompt_tokens"] == {"cheap": 11}
+
+
+def test_cascade_keeps_extra_calls_in_conversation():
+    """Test that review, second sample and parser retry get the tier thread id."""
+    threads = []
+
+    def agent(content):
+        def call(messages, config):
+            threads.append(config["configurable"].get("thread_id"))
+            return AIMessage(content=content)
+
+        return RunnableLambda(call)
+
+    generate = agent("The answer is 1")
+    reflect = agent("ALL_OK")
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect)
+    parser = RetryOutputParser.from_llm(
+        parser=JsonOutputParser(), llm=agent('{"steps": [], "answer": "1"}')
+    )
+    cheap = CascadeTier("cheap", graph, parser, generate, reflect)
+    strong, _ = make_tier("strong", ['{"steps": [], "answer": "2"}'])
+
+    ModelCascade([cheap, strong], ["critic", "agreement"]).answer("question", "0")
+
+    # Seven graph calls, the parser retry, the final review and the second sample
+    assert len(threads) == 10
+    assert set(threads) == {"0-cheap"}
+
+
+def test_cascade_selects_batch_critic_for_joint_questions():
+    """Test that only questions asked together select the batch critic."""
+    critics = []
+
+    def reflect(messages, config):
+        critics.append(config["configurable"].get("critic"))
+        return AIMessage(content="ALL_OK")
+
+    def generate(messages):
+        return AIMessage(content='[{"steps": [], "answer": "1"}]')
+
+    generate = RunnableLambda(generate)
+    reflect = RunnableLambda(reflect)
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect)
+    tier = CascadeTier("cheap", graph, JsonOutputParser(), generate, reflect)
+    cascade = ModelCascade([tier])
+
+    cascade.answer("question", "0")
+    assert set(critics) == {"single"}
+
+    critics.clear()
+    cascade.answer("questions", "1", questions=2)
+    assert set(critics) == {"batch"}
+
+
+def test_cascade_flags_failed_escalation():
+    """Test that a rejected answer kept after a failed escalation is flagged."""
+
+    def fail(messages):
+        raise RuntimeError("Service unavailable")
+
+    cheap, _ = make_tier("cheap", ['{"steps": [], "answer": "1"}'], ["Wrong total"])
+    agent = RunnableLambda(fail)
+    graph = FinancialAnalysisGraph.create_graph(agent, agent)
+    strong = CascadeTier("strong", graph, JsonOutputParser(), agent, agent)
+
+    result = ModelCascade([cheap, strong]).answer("question", "0")
+
+    assert result["tier"] == "cheap"
+    assert result["answers"] == [{"steps": [], "answer": "1"}]
+    assert result["error"] == "escalation"
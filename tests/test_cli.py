@@ -0,0 +1,152 @@
+import json
+import re
+
+import mlflow
+import pandas as pd
+import pytest
+
+import cli
+from fin_qa import llm_stub
+from fin_qa.llm_stub import REQUESTS
+
+
+def make_record(record_id, questions):
+    record = {
+        "pre_text": ["revenue was $ 4.5 million"],
+        "post_text": ["end ."],
+        "table": [["", "2013", "2012"], ["a", "1", "2"]],
+        "id": record_id,
+    }
+    if len(questions) == 1:
+        record["qa"] = {"question": questions[0], "answer": "12.0"}
+    else:
+        for i, question in enumerate(questions):
+            record[f"qa_{i}"] = {"question": question, "answer": "12.0"}
+    return record
+
+
+@pytest.fixture
+def cli_run(tmp_path, monkeypatch, stub_servers):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("OPENAI_API_VERSION", "2024-06-01")
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", f"sqlite:///{tmp_path}/mlflow.db")
+    data_path = tmp_path / "train.json"
+    data_path.write_text(
+        json.dumps(
+            [
+                make_record("Single_JKHY/2009/page_0.pdf-0", ["what is total?"]),
+                make_record("Double_ZBH/2002/page_5.pdf-5", ["what is x?", "y?"]),
+            ]
+        )
+    )
+
+    def start(**stub_kwargs):
+        app, url = stub_servers(**stub_kwargs)
+        monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", url)
+
+        def run(**kwargs):
+            mlflow.end_run()
+            n = kwargs.pop("n", 2)
+            cli.main("gpt-4o", 0.0, str(data_path), n, False, **kwargs)
+            run_id = mlflow.last_active_run().info.run_id
+            return mlflow.get_run(run_id).data.metrics
+
+        return app, run
+
+    yield start
+    mlflow.end_run()
+
+
+def test_ids_file_without_failures_processes_nothing(tmp_path, cli_run):
+    """Test that an ids file with no failed questions does not rerun everything."""
+    app, run = cli_run()
+    ids_file = tmp_path / "previous.csv"
+    pd.DataFrame(
+        [{"id": "Single_JKHY/2009/page_0.pdf-0", "numerical_match": True}]
+    ).to_csv(ids_file, index=False)
+
+    metrics = run(ids_file=str(ids_file))
+
+    assert "questions" not in metrics
+    assert sum(app[REQUESTS].values()) == 0
+
+
+def test_ids_file_reruns_failed_questions_only(tmp_path, cli_run):
+    """Test that only the failed question of a record is asked again."""
+    _, run = cli_run()
+    ids_file = tmp_path / "previous.csv"
+    pd.DataFrame(
+        [
+            {
+                "id": "Double_ZBH/2002/page_5.pdf-5",
+                "question": "what is x?",
+                "numerical_match": True,
+            },
+            {
+                "id": "Double_ZBH/2002/page_5.pdf-5",
+                "question": "y?",
+                "numerical_match": False,
+            },
+        ]
+    ).to_csv(ids_file, index=False)
+
+    metrics = run(ids_file=str(ids_file))
+
+    assert metrics["questions"] == 1
+
+
+def test_unknown_ids_process_nothing(cli_run):
+    """Test that a run of ids missing from the data file stops early."""
+    app, run = cli_run()
+
+    metrics = run(ids=["Single_ZBH/2002/page_46.pdf-3"])
+
+    assert "questions" not in metrics
+    assert sum(app[REQUESTS].values()) == 0
+
+
+def test_failed_questions_are_kept_as_misses(cli_run):
+    """Test that questions without an answer count against the accuracy."""
+    _, run = cli_run(failure_rate=1.0, failure_status=400)
+
+    metrics = run()
+
+    assert metrics["questions"] == 3
+    assert metrics["errors"] == 3
+    assert metrics["numerical_match"] == 0
+
+
+def test_joint_questions_report_every_question(cli_run):
+    """Test that asking questions together reports as many questions."""
+    _, run = cli_run()
+
+    separate = run()
+    joint = run(joint_questions=True)
+
+    assert separate["questions"] == joint["questions"] == 3
+    assert separate["numerical_match"] == joint["numerical_match"] == 100
+    assert joint["joint_fallbacks"] == 0
+    assert joint["total_llm_calls"] < separate["total_llm_calls"]
+
+
+def test_joint_answer_falls_back_to_single_questions(cli_run, monkeypatch):
+    """Test that questions are asked alone when the joint answer cannot be split."""
+    # The stub answers joint prompts with a single object
+    monkeypatch.setattr(llm_stub, "BATCH_QUESTION_PATTERN", re.compile(r"(?!)"))
+    _, run = cli_run()
+
+    metrics = run(joint_questions=True)
+
+    assert metrics["questions"] == 3
+    assert metrics["numerical_match"] == 100
+    assert metrics["joint_fallbacks"] == 2
+
+
+def test_sequential_run_defaults_to_all_records(cli_run):
+    """Test that a sequential run without --n may go through every record."""
+    _, run = cli_run()
+
+    metrics = run(n=None, sample="question-count", sequential=True)
+
+    assert metrics["questions"] == 3
@@ -4,7 +4,14 @@ import tempfile
 import pytest
 from pathlib import Path
 
-from fin_qa.data_loader import load_financial_data, load_prompt_template, environment
+from fin_qa.data_loader import (
+    RecordIndex,
+    environment,
+    load_financial_data,
+    load_prompt_template,
+    read_ids_file,
+    scan_record_offsets,
+)
 
 
 def test_load_financial_data_valid_json():
@@ -87,4 +94,79 @@ def test_load_prompt_template():
 
 def test_load_prompt_template_not_found():
     with pytest.raises(Exception):
-        load_prompt_template("nonexistent_template")
\ No newline at end of file
+        load_prompt_template("nonexistent_template")
+
+
+def write_records(path, records):
+    with open(path, 'w') as f:
+        json.dump(records, f, indent=2)
+
+
+def test_scan_record_offsets():
+    records = [
+        {"id": "a", "text": 'brackets ] } in "strings" \\ too'},
+        {"id": "b", "nested": [{"x": [1, 2]}, {"y": {}}]},
+    ]
+    data = json.dumps(records).encode()
+
+    offsets = scan_record_offsets(data)
+
+    assert [json.loads(data[start:end]) for start, end in offsets] == records
+
+
+def test_record_index_read_by_id(tmp_path):
+    records = [{"id": f"Single_A/2009/page_{i}.pdf-1", "value": i} for i in range(5)]
+    data_path = tmp_path / "train.json"
+    write_records(data_path, records)
+
+    index = RecordIndex.load(str(data_path))
+    loaded = list(index.read(["Single_A/2009/page_3.pdf-1", "missing", "Single_A/2009/page_0.pdf-1"]))
+
+    assert [record["value"] for record in loaded] == [3, 0]
+    assert RecordIndex.index_path(str(data_path)).exists()
+    assert index.ids == [record["id"] for record in records]
+
+
+def test_record_index_reuses_sidecar(tmp_path):
+    data_path = tmp_path / "train.json"
+    write_records(data_path, [{"id": "a"}])
+    RecordIndex.build(str(data_path))
+
+    # Corrupt the cached ids to check that the sidecar is read back
+    index_path = RecordIndex.index_path(str(data_path))
+    content = json.loads(index_path.read_text())
+    content["ids"] = ["cached"]
+    index_path.write_text(json.dumps(content))
+
+    assert RecordIndex.load(str(data_path)).ids == ["cached"]
+
+
+def test_record_index_rebuilds_when_stale(tmp_path):
+    data_path = tmp_path / "train.json"
+    write_records(data_path, [{"id": "a"}])
+    RecordIndex.load(str(data_path))
+
+    write_records(data_path, [{"id": "a"}, {"id": "b"}])
+    os.utime(data_path, ns=(0, 0))
+
+    assert RecordIndex.load(str(data_path)).ids == ["a", "b"]
+
+
+def test_read_ids_file_text(tmp_path):
+    ids_path = tmp_path / "ids.txt"
+    ids_path.write_text("a\n\nb\na\n")
+
+    assert read_ids_file(str(ids_path)) == [("a", None), ("b", None)]
+
+
+def test_read_ids_file_failed_questions(tmp_path):
+    output_path = tmp_path / "output.csv"
+    output_path.write_text(
+        "id,question,numerical_match\n"
+        "a,q1,TRUE\n"
+        "b,q2,FALSE\n"
+        "c,q3,TRUE\n"
+        "c,q4,FALSE\n"
+    )
+
+    assert read_ids_file(str(output_path)) == [("b", "q2"), ("c", "q4")]
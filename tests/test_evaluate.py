@@ -3,7 +3,10 @@ import math
 
 from fin_qa.evaluate import (
     extract_number, 
+    intervals_converged,
+    median_interval,
     numerical_match, 
+    proportion_interval,
 )
 
 
@@ -50,4 +53,26 @@ def test_numerical_match_precision():
     """Test precision handling"""
     assert numerical_match("1.23456", "1.23")
     assert numerical_match("0.999999", "1.0")
-    assert not numerical_match("1.234", "1.735")
\ No newline at end of file
+    assert not numerical_match("1.234", "1.735")
+
+def test_proportion_interval():
+    """Test the Wilson interval of a proportion"""
+    low, high = proportion_interval(50, 100)
+    assert low < 0.5 < high
+    assert high - low == pytest.approx(0.19, abs=0.01)
+    assert proportion_interval(0, 0) == (0.0, 1.0)
+
+def test_median_interval():
+    """Test the distribution-free interval of the median"""
+    values = list(range(100))
+    low, high = median_interval(values)
+    assert low < 49.5 < high
+    assert median_interval([]) == (-math.inf, math.inf)
+
+def test_intervals_converged():
+    """Test the sequential stopping rule"""
+    matches = [True, False] * 200
+    latencies = [10.0] * 400
+    assert intervals_converged(matches, latencies, nm_width=10, p50_width=1)
+    assert not intervals_converged(matches[:40], latencies[:40], nm_width=10, p50_width=1)
+    assert not intervals_converged(matches, latencies, nm_width=10, p50_width=1, min_samples=500)
@@ -0,0 +1,144 @@
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from fin_qa.graph import FinancialAnalysisGraph
+from fin_qa.latency import Deadline, LatencyTracker
+
+
+def make_agents():
+    calls = {"generate": 0, "reflect": 0}
+
+    def generate(messages):
+        calls["generate"] += 1
+        return AIMessage(content='{"steps": [], "answer": "1"}')
+
+    def reflect(messages):
+        calls["reflect"] += 1
+        return AIMessage(content="ALL_OK")
+
+    return RunnableLambda(generate), RunnableLambda(reflect), calls
+
+
+def run(graph, config):
+    return graph.invoke({"messages": [HumanMessage(content="question")]}, config)
+
+
+def test_graph_runs_all_rounds():
+    """Test that the graph alternates generation and reflection."""
+    generate, reflect, calls = make_agents()
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect)
+
+    response = run(graph, {"configurable": {"thread_id": "0"}})
+
+    assert calls == {"generate": 4, "reflect": 3}
+    assert isinstance(response["messages"][-1], AIMessage)
+
+
+def test_graph_records_node_latencies():
+    """Test that node latencies are recorded in the tracker."""
+    generate, reflect, _ = make_agents()
+    tracker = LatencyTracker(min_samples=1)
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect, tracker)
+
+    run(graph, {"configurable": {"thread_id": "0"}})
+
+    assert len(tracker.samples["generate"]) == 4
+    assert len(tracker.samples["reflect"]) == 3
+
+
+def test_graph_stops_at_deadline():
+    """Test that no further round is started once the deadline is spent."""
+    generate, reflect, calls = make_agents()
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect)
+    deadline = Deadline(0.0)
+
+    response = run(graph, {"configurable": {"thread_id": "0", "deadline": deadline}})
+
+    assert calls == {"generate": 1, "reflect": 0}
+    assert deadline.hit
+    assert isinstance(response["messages"][-1], AIMessage)
+
+
+def test_graph_compact_state_keeps_window():
+    """Test that compact mode sends a bounded window to both agents."""
+    sizes = {"generate": [], "reflect": []}
+
+    def generate(messages):
+        sizes["generate"].append(len(messages))
+        return AIMessage(content='{"steps": [], "answer": "1"}')
+
+    def reflect(messages):
+        sizes["reflect"].append(len(messages))
+        return AIMessage(content="ALL_OK")
+
+    graph = FinancialAnalysisGraph.create_graph(
+        RunnableLambda(generate), RunnableLambda(reflect), compact=True
+    )
+
+    response = run(graph, {"configurable": {"thread_id": "0"}})
+
+    assert sizes == {"generate": [1, 3, 3, 3], "reflect": [2, 2, 2]}
+    assert len(response["messages"]) == 3
+    assert isinstance(response["messages"][-1], AIMessage)
+
+
+def test_graph_compact_state_summarizes_rounds():
+    """Test that earlier answers are summarized once they leave the window."""
+    inputs = []
+
+    def generate(messages):
+        inputs.append(messages)
+        return AIMessage(content=f'{{"steps": [], "answer": "{len(inputs)}"}}')
+
+    graph = FinancialAnalysisGraph.create_graph(
+        RunnableLambda(generate),
+        RunnableLambda(lambda messages: AIMessage(content="ALL_OK")),
+        compact=True,
+        summarize=True,
+    )
+
+    response = run(graph, {"configurable": {"thread_id": "0"}})
+
+    assert "Round 1 answer: 1" in inputs[2][1].content
+    assert response["summary"] == [
+        "Round 1 answer: 1",
+        "Round 2 answer: 2",
+        "Round 3 answer: 3",
+    ]
+
+
+def test_graph_records_prompt_tokens():
+    """Test that prompt tokens of every LLM call are kept in the state."""
+
+    def generate(messages):
+        return AIMessage(
+            content="{}",
+            usage_metadata={
+                "input_tokens": len(messages),
+                "output_tokens": 1,
+                "total_tokens": len(messages) + 1,
+            },
+        )
+
+    graph = FinancialAnalysisGraph.create_graph(
+        RunnableLambda(generate), RunnableLambda(generate)
+    )
+
+    response = run(graph, {"configurable": {"thread_id": "0"}})
+
+    assert response["prompt_tokens"] == [1, 2, 3, 4, 5, 6, 7]
+
+
+def test_graph_deadline_uses_first_samples():
+    """Test that the round estimate does not wait for the hedging minimum."""
+    generate, reflect, calls = make_agents()
+    tracker = LatencyTracker()
+    tracker.record("generate", 1.0)
+    tracker.record("reflect", 1.0)
+    graph = FinancialAnalysisGraph.create_graph(generate, reflect, tracker)
+    deadline = Deadline(1.5)
+
+    run(graph, {"configurable": {"thread_id": "0", "deadline": deadline}})
+
+    assert calls == {"generate": 1, "reflect": 0}
+    assert deadline.hit
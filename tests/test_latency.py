@@ -0,0 +1,134 @@
+import time
+
+import pytest
+
+from fin_qa.latency import Deadline, HedgedRunnable, LatencyTracker
+
+
+class SlowRunnable:
+    """Runnable whose n-th call sleeps for the n-th configured delay."""
+
+    def __init__(self, delays):
+        self.delays = list(delays)
+        self.calls = 0
+
+    def invoke(self, input, config=None):
+        delay = self.delays[min(self.calls, len(self.delays) - 1)]
+        call = self.calls
+        self.calls += 1
+        time.sleep(delay)
+        return f"{input}-{call}"
+
+
+class FailingRunnable:
+    def invoke(self, input, config=None):
+        raise ValueError("boom")
+
+
+def warm_tracker(name, latency, n=20):
+    tracker = LatencyTracker(min_samples=n)
+    for _ in range(n):
+        tracker.record(name, latency)
+    return tracker
+
+
+def test_deadline_allows_within_budget():
+    """Test that work fitting in the budget is allowed."""
+    deadline = Deadline(10.0)
+
+    assert deadline.allows(1.0)
+    assert not deadline.hit
+    assert 0 < deadline.remaining() <= 10.0
+
+
+def test_deadline_marks_hit_when_exhausted():
+    """Test that the deadline is marked as hit when the estimate does not fit."""
+    deadline = Deadline(1.0)
+
+    assert not deadline.allows(5.0)
+    assert deadline.hit
+
+
+def test_latency_tracker_requires_min_samples():
+    """Test that percentiles are only reported once enough samples exist."""
+    tracker = LatencyTracker(min_samples=3)
+    tracker.record("generate", 1.0)
+    tracker.record("generate", 2.0)
+
+    assert tracker.percentile("generate", 90) is None
+    assert tracker.percentile("reflect", 90) is None
+
+    tracker.record("generate", 3.0)
+
+    assert tracker.percentile("generate", 50) == pytest.approx(2.0)
+
+
+def test_latency_tracker_min_samples_override():
+    """Test that a caller can ask for a percentile with fewer samples."""
+    tracker = LatencyTracker(min_samples=3)
+    tracker.record("generate", 1.0)
+
+    assert tracker.percentile("generate", 50) is None
+    assert tracker.percentile("generate", 50, min_samples=1) == pytest.approx(1.0)
+
+
+def test_latency_tracker_window():
+    """Test that only the most recent samples are kept."""
+    tracker = LatencyTracker(window=2, min_samples=1)
+    for latency in [10.0, 1.0, 1.0]:
+        tracker.record("generate", latency)
+
+    assert tracker.percentile("generate", 100) == pytest.approx(1.0)
+
+
+def test_hedged_runnable_no_hedge_without_samples():
+    """Test that requests are not hedged before latencies are learned."""
+    runnable = SlowRunnable([0.05])
+    hedged = HedgedRunnable(runnable, "generate", LatencyTracker())
+
+    assert hedged.invoke("q") == "q-0"
+    assert runnable.calls == 1
+    assert hedged.hedged == 0
+
+
+def test_hedged_runnable_fast_primary():
+    """Test that fast requests are not duplicated."""
+    runnable = SlowRunnable([0.0])
+    hedged = HedgedRunnable(runnable, "generate", warm_tracker("generate", 1.0))
+
+    assert hedged.invoke("q") == "q-0"
+    assert runnable.calls == 1
+    assert hedged.hedged == 0
+
+
+def test_hedged_runnable_hedge_wins():
+    """Test that a duplicate is sent for slow requests and the faster one wins."""
+    runnable = SlowRunnable([1.0, 0.0])
+    hedged = HedgedRunnable(runnable, "generate", warm_tracker("generate", 0.05))
+
+    assert hedged.invoke("q") == "q-1"
+    assert hedged.hedged == 1
+    assert hedged.hedge_wins == 1
+
+
+def test_hedged_runnable_records_primary_latency():
+    """Test that the latency of the slow first request is learned, not the hedge."""
+    runnable = SlowRunnable([0.3, 0.0])
+    tracker = warm_tracker("generate", 0.05)
+    hedged = HedgedRunnable(runnable, "generate", tracker)
+
+    hedged.invoke("q")
+    hedged._executor.shutdown(wait=True)
+
+    assert len(tracker.samples["generate"]) == 21
+    assert tracker.samples["generate"][-1] >= 0.3
+
+
+def test_hedged_runnable_raises_when_all_fail():
+    """Test that errors are surfaced when every request fails."""
+    hedged = HedgedRunnable(
+        FailingRunnable(), "generate", warm_tracker("generate", 0.0)
+    )
+
+    with pytest.raises(ValueError):
+        hedged.invoke("q")
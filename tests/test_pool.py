@@ -0,0 +1,179 @@
+import json
+from collections import Counter
+
+import httpx
+import openai
+from langchain_core.messages import HumanMessage
+
+from fin_qa.llm_stub import REQUESTS
+from fin_qa.pool import EndpointPool, PooledChatModel, PoolEndpoint, load_pools
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_error(status):
+    request = httpx.Request("POST", "http://stub")
+    response = httpx.Response(status, request=request)
+    if status == 429:
+        return openai.RateLimitError("Throttled", response=response, body=None)
+    if status >= 500:
+        return openai.InternalServerError("Unavailable", response=response, body=None)
+    return openai.BadRequestError("Bad request", response=response, body=None)
+
+
+def make_pool(weights, versions=None, strategy="least-outstanding", **kwargs):
+    versions = versions or [None] * len(weights)
+    endpoints = [
+        PoolEndpoint(f"http://stub-{i}", "gpt-4o", "key", weight=w, model_version=v)
+        for i, (w, v) in enumerate(zip(weights, versions))
+    ]
+    return EndpointPool("gpt-4o", endpoints, strategy, **kwargs)
+
+
+def test_round_robin_follows_weights():
+    """Test that weighted round robin spreads calls by weight."""
+    pool = make_pool([3, 1], strategy="round-robin")
+
+    counts = Counter()
+    for _ in range(8):
+        endpoint = pool.acquire()
+        counts[endpoint.endpoint] += 1
+        pool.release(endpoint)
+
+    assert counts == {"http://stub-0": 6, "http://stub-1": 2}
+
+
+def test_least_outstanding_balances_in_flight_calls():
+    """Test that calls go to the endpoint with the fewest calls per weight."""
+    pool = make_pool([2, 1])
+
+    acquired = [pool.acquire() for _ in range(6)]
+
+    assert Counter(e.endpoint for e in acquired) == {
+        "http://stub-0": 4,
+        "http://stub-1": 2,
+    }
+
+
+def test_endpoint_is_ejected_and_probed_back():
+    """Test that a failing endpoint is ejected, then rejoins after a probe."""
+    clock = FakeClock()
+    pool = make_pool([1, 1], max_failures=2, ejection_time=10, clock=clock)
+    failing = pool.endpoints[0]
+
+    for _ in range(2):
+        failing.outstanding += 1
+        pool.release(failing, make_error(503))
+    assert failing.ejected_until == 10
+
+    # Ejected endpoints receive no calls
+    for _ in range(4):
+        endpoint = pool.acquire()
+        assert endpoint is not failing
+        pool.release(endpoint)
+
+    # A single probe is sent once the ejection is over
+    clock.now = 11
+    probe = pool.acquire()
+    assert probe is failing
+    assert pool.acquire() is not failing
+
+    pool.release(probe)
+    assert failing.ejected_until is None
+
+
+def test_failed_probe_doubles_ejection():
+    """Test that a failed probe ejects the endpoint for twice as long."""
+    clock = FakeClock()
+    pool = make_pool([1, 1], max_failures=1, ejection_time=10, clock=clock)
+    failing = pool.endpoints[0]
+    failing.outstanding += 1
+    pool.release(failing, make_error(429))
+
+    clock.now = 11
+    probe = pool.acquire()
+    pool.release(probe, make_error(429))
+
+    assert failing.ejected_until == 31
+    assert failing.ejections == 2
+
+
+def test_client_errors_do_not_eject():
+    """Test that errors caused by the request do not count against an endpoint."""
+    pool = make_pool([1], max_failures=1)
+    endpoint = pool.acquire()
+
+    pool.release(endpoint, make_error(400))
+
+    assert endpoint.ejected_until is None
+
+
+def test_conversation_keeps_model_version():
+    """Test that a conversation stays on the model version it started with."""
+    pool = make_pool([1, 1, 1], ["2024-05-13", "2024-08-06", "2024-08-06"])
+
+    first = pool.acquire("thread")
+    pool.release(first)
+    versions = set()
+    for _ in range(6):
+        endpoint = pool.acquire("thread")
+        versions.add(endpoint.model_version)
+        pool.release(endpoint)
+
+    assert versions == {first.model_version}
+
+
+def test_load_pools_reads_keys_from_environment(tmp_path, monkeypatch):
+    """Test that API keys are read from the environment variables of the file."""
+    monkeypatch.setenv("EAST_KEY", "secret")
+    path = tmp_path / "pool.json"
+    path.write_text(
+        json.dumps(
+            {
+                "gpt-4o": [
+                    {
+                        "endpoint": "http://east",
+                        "deployment": "gpt-4o",
+                        "api_key_env": "EAST_KEY",
+                        "weight": 450,
+                    }
+                ]
+            }
+        )
+    )
+
+    pools = load_pools(str(path), "round-robin")
+
+    endpoint = pools["gpt-4o"].endpoints[0]
+    assert endpoint.api_key == "secret"
+    assert endpoint.weight == 450
+    assert pools["gpt-4o"].strategy == "round-robin"
+
+
+def test_pooled_model_fails_over_from_unhealthy_stub(stub_servers):
+    """Test that calls fail over to healthy stand-in servers."""
+    healthy_app, healthy_url = stub_servers()
+    failing_app, failing_url = stub_servers(failure_rate=1.0, failure_status=503)
+    pool = EndpointPool(
+        "gpt-4o",
+        [
+            PoolEndpoint(url, "gpt-4o", "stub", api_version="2024-06-01")
+            for url in [healthy_url, failing_url]
+        ],
+        max_failures=1,
+    )
+    llm = PooledChatModel(pool).with_retry(stop_after_attempt=3)
+
+    for _ in range(4):
+        res = llm.invoke([HumanMessage(content="question")])
+        assert json.loads(res.content)["answer"] == "12.0"
+
+    assert failing_app[REQUESTS]["gpt-4o"] == 1
+    assert healthy_app[REQUESTS]["gpt-4o"] == 4
+    assert pool.stats()[1]["ejected"]
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import Counter
+
+from fin_qa.profiling import (
+    LLM_WAIT,
+    LOCAL,
+    SamplingProfiler,
+    classify_stack,
+    render_flamegraph,
+)
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def test_classify_stack_local():
+    """Test that stacks outside LLM HTTP calls are local work."""
+    frames = [("/app/cli.py", "main"), ("/app/src/fin_qa/graph.py", "generation_node")]
+
+    assert classify_stack(frames) == LOCAL
+
+
+def test_classify_stack_llm_wait():
+    """Test that stacks inside the HTTP client are LLM wait."""
+    frames = [
+        ("/app/cli.py", "main"),
+        ("/venv/site-packages/httpx/_client.py", "send"),
+        ("/usr/lib/python3.10/ssl.py", "recv_into"),
+    ]
+
+    assert classify_stack(frames) == LLM_WAIT
+
+
+def test_classify_stack_retry_backoff():
+    """Test that backoff sleeps before retrying LLM calls are LLM wait."""
+    tenacity_frames = [
+        ("/app/src/fin_qa/graph.py", "generation_node"),
+        ("/venv/site-packages/langchain_core/runnables/retry.py", "invoke"),
+        ("/venv/site-packages/tenacity/__init__.py", "__call__"),
+        ("/venv/site-packages/tenacity/nap.py", "sleep"),
+    ]
+    openai_frames = [
+        ("/app/src/fin_qa/graph.py", "generation_node"),
+        ("/venv/site-packages/openai/_base_client.py", "request"),
+        ("/venv/site-packages/openai/_base_client.py", "_sleep_for_retry"),
+    ]
+
+    assert classify_stack(tenacity_frames) == LLM_WAIT
+    assert classify_stack(openai_frames) == LLM_WAIT
+
+
+def test_classify_stack_idle():
+    """Test that threads waiting for work are ignored."""
+    frames = [
+        ("/usr/lib/python3.10/threading.py", "_bootstrap"),
+        ("/usr/lib/python3.10/threading.py", "wait"),
+    ]
+
+    assert classify_stack(frames) is None
+    assert classify_stack([]) is None
+
+
+def test_sampling_profiler_counts_thread_seconds():
+    """Test that concurrent busy threads add up to more than the wall time."""
+    with SamplingProfiler(interval=0.001) as profiler:
+        threads = [threading.Thread(target=busy, args=(0.3,)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert profiler.wall_seconds > 0
+    assert profiler.seconds[LOCAL] > profiler.wall_seconds
+
+
+def test_sampling_profiler_collects_local_samples():
+    """Test that busy threads are sampled as local work."""
+    with SamplingProfiler(interval=0.001) as profiler:
+        thread = threading.Thread(target=busy, args=(0.2,))
+        thread.start()
+        thread.join()
+
+    assert profiler.seconds[LOCAL] > 0
+    assert any("busy" in label for stack in profiler.stacks for label in stack)
+
+    hotspots = profiler.hotspots(top=5)
+    assert len(hotspots) <= 5
+    assert hotspots[0]["self_samples"] >= hotspots[-1]["self_samples"]
+
+
+def test_folded_format():
+    """Test the folded stack export."""
+    profiler = SamplingProfiler()
+    profiler.stacks = Counter({(LOCAL, "main (cli.py:1)", "busy (cli.py:9)"): 3})
+
+    assert profiler.folded() == "local;main (cli.py:1);busy (cli.py:9) 3"
+
+
+def test_render_flamegraph():
+    """Test that a flame graph is rendered with one frame per node."""
+    stacks = Counter(
+        {
+            (LOCAL, "main", "render<template>"): 3,
+            (LLM_WAIT, "main", "send"): 1,
+        }
+    )
+
+    svg = render_flamegraph(stacks)
+
+    assert svg.startswith("<svg")
+    assert svg.count("<rect") == 6
+    assert "render&lt;template&gt;" in svg
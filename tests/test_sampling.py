@@ -0,0 +1,99 @@
+from collections import Counter
+
+import pytest
+
+from fin_qa.sampling import parse_record_id, record_stratum, sample_records
+
+
+def make_records():
+    records = []
+    for i in range(40):
+        ticker = "AAPL" if i < 30 else "UPS"
+        record = {"id": f"Single_{ticker}/2009/page_{i}.pdf-1", "qa": {}}
+        if i % 4 == 0:
+            record = {
+                "id": f"Double_{ticker}/2009/page_{i}.pdf",
+                "qa_0": {"question": "a"},
+                "qa_1": {"question": "b"},
+            }
+        records.append(record)
+    return records
+
+
+def test_parse_record_id():
+    """Test parsing kind, ticker and year from a record id."""
+    assert parse_record_id("Single_JKHY/2009/page_28.pdf-3") == ("Single", "JKHY", "2009")
+    assert parse_record_id("Double_BRK/B/2010/page_2.pdf") == (
+        "Double",
+        "BRK/B",
+        "2010",
+    )
+    assert parse_record_id("invalid") == ("", "", "")
+
+
+def test_record_stratum_question_count():
+    """Test stratifying records by number of questions."""
+    records = make_records()
+
+    assert record_stratum(records[0], "question-count") == ("multi",)
+    assert record_stratum(records[1], "question-count") == ("single",)
+
+
+def test_sample_records_head():
+    """Test that the head strategy keeps the first n records."""
+    records = make_records()
+
+    assert sample_records(records, 5) == records[:5]
+
+
+def test_sample_records_random_is_seeded():
+    """Test that random sampling is reproducible with a seed."""
+    records = make_records()
+
+    sample = sample_records(records, 10, "random", seed=1)
+
+    assert len(sample) == 10
+    assert sample == sample_records(records, 10, "random", seed=1)
+
+
+def test_sample_records_stratified_proportions():
+    """Test that stratified samples follow the strata proportions."""
+    records = make_records()
+
+    sample = sample_records(records, 20, "ticker-year", seed=0)
+    tickers = Counter(record_stratum(record, "ticker-year")[0] for record in sample)
+
+    assert tickers == {"AAPL": 15, "UPS": 5}
+
+    sample = sample_records(records, 20, "question-count", seed=0)
+    kinds = Counter(record_stratum(record, "question-count") for record in sample)
+
+    assert kinds == {("single",): 15, ("multi",): 5}
+
+
+def test_sample_records_stratified_prefixes():
+    """Test that every prefix of a stratified sample follows the proportions."""
+    records = make_records()
+
+    sample = sample_records(records, 20, "ticker-year", seed=0)
+
+    for size in range(1, len(sample) + 1):
+        tickers = Counter(
+            record_stratum(record, "ticker-year")[0] for record in sample[:size]
+        )
+        assert abs(tickers["AAPL"] - 0.75 * size) <= 1
+
+
+def test_sample_records_larger_than_data():
+    """Test that sampling more records than available returns all of them."""
+    records = make_records()
+
+    sample = sample_records(records, 100, "question-count", seed=0)
+
+    assert sorted(r["id"] for r in sample) == sorted(r["id"] for r in records)
+
+
+def test_sample_records_unknown_strategy():
+    """Test that an unknown strategy raises an error."""
+    with pytest.raises(ValueError):
+        sample_records(make_records(), 5, "unknown")
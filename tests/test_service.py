@@ -0,0 +1,185 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from fin_qa.graph import FinancialAnalysisGraph
+from fin_qa.pool import EndpointPool, PoolEndpoint
+from fin_qa.service import (
+    OverloadedError,
+    QAService,
+    context_key,
+    create_app,
+    validate_payload,
+)
+
+PAYLOAD = {
+    "pre_text": ["revenue was $ 4.5 million"],
+    "post_text": "",
+    "table": [["", "2013"], ["revenue", "4.5"]],
+    "question": "what was the revenue?",
+}
+
+
+class FakeGraph:
+    """Graph streaming one answer and one critique per run."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.runs = []
+
+    async def astream(self, state, config, stream_mode):
+        self.runs.append(state["messages"][0].content)
+        await asyncio.sleep(self.delay)
+        answer = '{"steps": ["4.5"], "answer": "4.5"}'
+        yield {"generate": {"messages": [AIMessage(content=answer)]}}
+        yield {"reflect": {"messages": [HumanMessage(content="ALL_OK")]}}
+        yield {"generate": {"messages": [AIMessage(content=answer)]}}
+
+
+class FakeParser:
+    def parse_with_prompt(self, completion, prompt_value):
+        return {"steps": ["4.5"], "answer": "4.5"}
+
+
+async def collect(events):
+    return [event async for event in events]
+
+
+def test_validate_payload():
+    """Test payload validation."""
+    assert validate_payload(PAYLOAD) == PAYLOAD
+
+    with pytest.raises(ValueError):
+        validate_payload({"question": "what?"})
+
+    with pytest.raises(ValueError):
+        validate_payload({**PAYLOAD, "table": "not a table"})
+
+
+def test_context_key_ignores_question():
+    """Test that payloads on the same document share a context key."""
+    assert context_key(PAYLOAD) == context_key({**PAYLOAD, "question": "other?"})
+    assert context_key(PAYLOAD) != context_key({**PAYLOAD, "post_text": "other"})
+
+
+def test_service_streams_events():
+    """Test that answers and critiques are streamed before the result."""
+
+    async def main():
+        service = QAService(FakeGraph(), FakeParser())
+        return await collect(service.submit(PAYLOAD))
+
+    events = asyncio.run(main())
+
+    assert [event["event"] for event in events] == [
+        "answer",
+        "critique",
+        "answer",
+        "result",
+    ]
+    assert events[-1]["answer"] == "4.5"
+
+
+def test_service_coalesces_identical_questions():
+    """Test that concurrent identical questions share one graph run."""
+
+    async def main():
+        graph = FakeGraph()
+        service = QAService(graph, FakeParser())
+        streams = [
+            service.submit(PAYLOAD),
+            service.submit(PAYLOAD),
+            service.submit({**PAYLOAD, "question": "what was the growth?"}),
+        ]
+        results = await asyncio.gather(*[collect(events) for events in streams])
+        return graph, service, results
+
+    graph, service, results = asyncio.run(main())
+
+    assert len(graph.runs) == 2
+    assert service.metrics.coalesced == 1
+    assert all(events[-1]["event"] == "result" for events in results)
+
+
+def test_service_rejects_when_queue_full():
+    """Test admission control once the queue is full."""
+
+    async def main():
+        service = QAService(FakeGraph(), FakeParser(), max_concurrency=1, max_queue=1)
+        events = service.submit(PAYLOAD)
+        # Identical questions are coalesced and still admitted
+        coalesced = service.submit(PAYLOAD)
+        with pytest.raises(OverloadedError):
+            service.submit({**PAYLOAD, "question": "what was the growth?"})
+        await asyncio.gather(collect(events), collect(coalesced))
+        return service
+
+    service = asyncio.run(main())
+
+    assert service.metrics.rejected == 1
+    assert service.metrics.queue_depth == 0
+
+
+def test_app_endpoints():
+    """Test the HTTP endpoints of the service."""
+
+    async def main():
+        service = QAService(FakeGraph(), FakeParser())
+        async with TestClient(TestServer(create_app(service))) as client:
+            response = await client.post("/qa", json=PAYLOAD)
+            lines = (await response.text()).splitlines()
+            invalid = await client.post("/qa", json={"question": "what?"})
+            metrics = await (await client.get("/metrics")).text()
+        return response.status, lines, invalid.status, metrics
+
+    status, lines, invalid_status, metrics = asyncio.run(main())
+
+    assert status == 200
+    assert len(lines) == 4
+    assert invalid_status == 400
+    assert "fin_qa_requests_total 1" in metrics
+    assert 'fin_qa_latency_seconds{quantile="0.5"}' in metrics
+
+
+def test_service_pins_runs_to_model_version():
+    """Test that every call of a run goes to the model version it started on."""
+    pool = EndpointPool(
+        "gpt-4o",
+        [
+            PoolEndpoint(f"http://stub-{i}", "gpt-4o", "key", model_version=version)
+            for i, version in enumerate(["2024-05-13", "2024-08-06"])
+        ],
+    )
+    calls = []
+
+    def agent(content):
+        def call(messages, config):
+            thread_id = config["configurable"].get("thread_id")
+            endpoint = pool.acquire(thread_id)
+            pool.release(endpoint)
+            calls.append((thread_id, endpoint.model_version))
+            return AIMessage(content=content)
+
+        return RunnableLambda(call)
+
+    graph = FinancialAnalysisGraph.create_graph(
+        agent('{"steps": ["4.5"], "answer": "4.5"}'),
+        agent("ALL_OK"),
+        checkpoint=False,
+    )
+
+    async def main():
+        service = QAService(graph, FakeParser())
+        await collect(service.submit(PAYLOAD))
+        await collect(service.submit({**PAYLOAD, "question": "what was the growth?"}))
+
+    asyncio.run(main())
+
+    threads = {thread_id for thread_id, _ in calls}
+    assert len(threads) == 2
+    assert None not in threads
+    for thread_id in threads:
+        assert len({version for t, version in calls if t == thread_id}) == 1